@@ -0,0 +1,134 @@
+"""
+Admission control for LLM-bound chat turns. A per-session token bucket caps how fast one session can
+send messages, and a concurrency limiter bounds how many turns talk to Gemini at once, with a bounded
+queue in front of it. When the bucket is empty, the queue is full or a queued turn waits too long, the
+request is rejected with `Overloaded`, which the API turns into 429 + Retry-After, instead of piling
+more latency onto every turn in flight. Limits are per process (per worker in multi-worker mode).
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+import contextlib
+import logging
+from ttl_cache import TTLCache, MISSING
+from tracing import span
+logger = logging.getLogger("Admission")
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") == "1"
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+GEMINI_MAX_QUEUE = int(os.getenv("GEMINI_MAX_QUEUE", "32"))
+GEMINI_QUEUE_TIMEOUT = float(os.getenv("GEMINI_QUEUE_TIMEOUT", "15"))
+SESSION_RATE_PER_SECOND = float(os.getenv("SESSION_RATE_PER_SECOND", "1"))
+SESSION_BURST = int(os.getenv("SESSION_BURST", "5"))
+
+
+class Overloaded(Exception):
+    """The turn was not admitted; retry after `retry_after` seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"{reason}, retry after {retry_after:.0f}s")
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+def is_rate_limit_error(exc: Exception) -> bool:
+    """Gemini's own 429 / RESOURCE_EXHAUSTED."""
+    return getattr(exc, "code", None) == 429 or "resource_exhausted" in str(exc).lower()
+
+
+class SessionRateLimiter:
+    """Token bucket per session: `burst` messages at once, refilled at `rate` per second."""
+
+    def __init__(self, rate: float = SESSION_RATE_PER_SECOND, burst: int = SESSION_BURST,
+                 maxsize: int = 100000):
+        self.rate = rate
+        self.burst = burst
+        # session_id -> (tokens, updated_at); an idle bucket is full again after burst / rate seconds
+        self._buckets = TTLCache(maxsize, max(burst / rate, 1.0) if rate > 0 else None)
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    def acquire(self, session_id: str):
+        """Takes one token for the session or raises Overloaded with the time until the next one."""
+        if not ADMISSION_ENABLED or not session_id or self.rate <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            state = self._buckets.get(session_id)
+            tokens, updated_at = (self.burst, now) if state is MISSING else state
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            if tokens < 1:
+                self._buckets.set(session_id, (tokens, now))
+                self.limited += 1
+                raise Overloaded("session_rate_limited", (1 - tokens) / self.rate)
+            self._buckets.set(session_id, (tokens - 1, now))
+
+
+class GeminiLimiter:
+    """
+    At most `max_concurrency` turns talk to Gemini at once; up to `max_queue` more wait (FIFO) for a slot,
+    each for at most `timeout` seconds. Anything beyond that is rejected straight away.
+    """
+
+    def __init__(self, max_concurrency: int = GEMINI_MAX_CONCURRENCY, max_queue: int = GEMINI_MAX_QUEUE,
+                 timeout: float = GEMINI_QUEUE_TIMEOUT):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._semaphore = None  # asyncio.Semaphore, created lazily inside the running loop
+        self.active = 0
+        self.waiting = 0
+        self._avg_hold = 2.0  # EWMA of seconds a turn holds its slot, for Retry-After
+        self.stats = {"admitted": 0, "queued": 0, "rejected_queue_full": 0, "rejected_timeout": 0,
+                      "upstream_throttled": 0, "wait_seconds_total": 0.0, "max_wait_seconds": 0.0}
+
+    def retry_after(self) -> float:
+        """Rough time until a newly queued turn would get a slot."""
+        return self._avg_hold * (self.waiting + 1) / max(self.max_concurrency, 1)
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        if not ADMISSION_ENABLED:
+            yield
+            return
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self._semaphore.locked() or self.waiting:
+            if self.waiting >= self.max_queue:
+                self.stats["rejected_queue_full"] += 1
+                raise Overloaded("queue_full", self.retry_after())
+            self.stats["queued"] += 1
+
+        self.waiting += 1
+        started = time.perf_counter()
+        try:
+            with span("gemini.queue"):
+                await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["rejected_timeout"] += 1
+            raise Overloaded("queue_timeout", self.retry_after())
+        finally:
+            self.waiting -= 1
+            waited = time.perf_counter() - started
+            self.stats["wait_seconds_total"] += waited
+            self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], waited)
+
+        self.active += 1
+        self.stats["admitted"] += 1
+        held_from = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._avg_hold = 0.9 * self._avg_hold + 0.1 * (time.perf_counter() - held_from)
+            self._semaphore.release()
+
+    def metrics(self) -> dict:
+        return {**self.stats, "active": self.active, "queue_depth": self.waiting,
+                "max_concurrency": self.max_concurrency, "max_queue": self.max_queue}
+
+
+gemini_limiter = GeminiLimiter()
+session_limiter = SessionRateLimiter()
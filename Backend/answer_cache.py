@@ -0,0 +1,104 @@
+"""
+Opt-in cache of rendered answers for stateless Stage 1 turns ("what fuel cards do you have",
+"list the benefits", "show more"). Turns are keyed on a normalized intent, never on raw text,
+and anything that could carry PII or belongs to the application flow is left uncached.
+"""
+import json
+import os
+import re
+import logging
+from ttl_cache import TTLCache, MISSING
+from fast_path import BENEFITS
+logger = logging.getLogger("Answer-Cache")
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "0") == "1"
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+
+_PII_RE = re.compile(r"\d{4,}|@|[A-Za-z]{5}\d{4}[A-Za-z]")
+_SELECTION_RE = re.compile(r"\b(apply|select|choose|chose|take|want the|go with|interested in|eligib)\w*", re.I)
+_BENEFITS_RE = re.compile(r"\b(what|which|list|show|tell)\b.*\bbenefits?\b|\bbenefit (types|options)\b", re.I)
+_MORE_RE = re.compile(r"^(show |give |see )?(me )?(some )?(more|next|other)( \w+){0,3}$", re.I)
+_FAILURE_PREFIXES = ("Gemini tool execution failed", "No valid response", "Agent execution failed")
+_CARDS_RE = re.compile(r"\bcards?\b", re.I)
+
+
+def _benefits_in(text: str) -> list:
+    return [b for b in BENEFITS if re.search(rf"\b{b.lower()}\b", text)]
+
+
+def stage1_intent(user_input: str, flow: dict):
+    """
+    Normalized intent tuple for a cacheable Stage 1 turn, else None. The LLM sees the whole history, so
+    once the session has had any free-text turn (flow["free_text"], e.g. "I'm Priya") nothing it says
+    later is cached: the answer could repeat that text to other sessions.
+    """
+    if flow.get("aadhaar") or flow.get("email") or flow.get("name") or flow.get("free_text"):
+        return None
+    text = " ".join(re.sub(r"[^\w@ ]", " ", (user_input or "").lower()).split())
+    if not text or len(text.split()) > 12 or _PII_RE.search(text) or _SELECTION_RE.search(text):
+        return None
+
+    benefits = _benefits_in(text)
+    if not benefits and _BENEFITS_RE.search(text):
+        return ("benefits",)
+    if not benefits and _MORE_RE.match(text) and flow.get("benefit"):
+        return ("cards", flow["benefit"], int(flow.get("page") or 1) + 1)
+    if len(benefits) == 1 and _CARDS_RE.search(text):
+        return ("cards", benefits[0], 1)
+    return None
+
+
+def advance_flow(flow: dict, intent: tuple):
+    if intent[0] == "cards":
+        flow["benefit"] = intent[1]
+        flow["page"] = intent[2]
+
+
+class AnswerCache:
+    def __init__(self, enabled: bool = ANSWER_CACHE_ENABLED, ttl: float = ANSWER_CACHE_TTL_SECONDS,
+                 maxsize: int = ANSWER_CACHE_SIZE):
+        self.enabled = enabled
+        self.cache = TTLCache(maxsize, ttl)
+
+    def lookup(self, user_input: str, flow: dict):
+        """
+        (intent, cached (answer, messages) or None); intent is None when the turn must not be cached.
+        `messages` are the turn's messages after the user's own text, tool calls included.
+        """
+        if not self.enabled:
+            return None, None
+        intent = stage1_intent(user_input, flow)
+        if intent is None:
+            return None, None
+        cached = self.cache.get(intent)
+        if cached is MISSING:
+            return intent, None
+        logger.info(f"Answer cache hit for {intent} (hit rate {self.cache.stats()['hit_rate']:.0%})")
+        answer, messages = cached
+        return intent, (answer, json.loads(messages))  # fresh copies for the session's history
+
+    def store(self, intent: tuple, answer: str, messages: list[dict]):
+        """
+        Caches the LLM turn only if it stayed stateless (no tools besides GetCreditCards). The
+        GetCreditCards call and result are kept with the answer, so later turns that check the chosen
+        card's thresholds see the same dataset whether or not this turn came from the cache.
+        """
+        if answer.startswith(_FAILURE_PREFIXES):
+            return
+        for message in messages:
+            for part in message.get("parts", []):
+                call = part.get("function_call")
+                if call and call.get("name") != "GetCreditCards":
+                    return
+                response = part.get("function_response")
+                if response and "error" in response.get("response", {}):
+                    return
+        # messages[0] is the user's own text; kept as JSON so no two sessions share the same dicts
+        self.cache.set(intent, (answer, json.dumps(messages[1:], ensure_ascii=False)))
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self) -> dict:
+        return self.cache.stats()
@@ -0,0 +1,85 @@
+"""
+SQLite copy of the CreditCards / pan / aadhaar / people tables filled with deterministic synthetic rows,
+for the benchmark (DB_BACKEND=sqlite SQLITE_DB_PATH=<file>). Can also be run directly:
+
+    python bench_fixture.py bench.db --cards 300 --people 200
+"""
+import argparse
+import random
+import sqlite3
+from fast_path import BENEFITS
+
+SCHEMA = """
+DROP TABLE IF EXISTS CreditCards;
+DROP TABLE IF EXISTS pan;
+DROP TABLE IF EXISTS aadhaar;
+DROP TABLE IF EXISTS people;
+CREATE TABLE CreditCards (
+    card_name TEXT, payment_network TEXT, major_benefit TEXT, joining_fee REAL, annual_fee REAL,
+    reward_method TEXT, fee_waiver TEXT, other_benefits TEXT, PreferredBank TEXT,
+    MinCIBIL INTEGER, MinAnnualIncome REAL
+);
+CREATE TABLE pan (panID TEXT PRIMARY KEY, CIBIL INTEGER, Annual_Income REAL);
+CREATE TABLE aadhaar (aadhaarID TEXT PRIMARY KEY, Mobile TEXT, address TEXT);
+CREATE TABLE people (Name TEXT, aadhaarID TEXT, panID TEXT);
+"""
+
+BANKS = ("HDFC", "Axis", "ICICI", "SBI", "Standard Chartered", "American Express", "Kotak", "IDFC First", "Yes Bank", "AU")
+PREFERRED = {"HDFC", "Axis", "ICICI", "SBI", "Standard Chartered", "American Express"}
+FIRST_NAMES = ("Ravi", "Asha", "Vikram", "Meera", "Arjun", "Priya", "Karan", "Neha", "Rahul", "Divya")
+LAST_NAMES = ("Kumar", "Sharma", "Iyer", "Reddy", "Nair", "Gupta", "Singh", "Menon", "Das", "Patel")
+
+
+def _pan(rng: random.Random, index: int) -> str:
+    letters = "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(5))
+    return f"{letters}{index % 10000:04d}{rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ')}"
+
+
+def create_fixture(path: str, cards: int = 300, people: int = 200, seed: int = 7) -> list[dict]:
+    """(Re)creates the tables at `path` and returns the people as dicts (name, aadhaar, pan, cibil, salary, mobile)."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+
+    card_rows = []
+    for i in range(cards):
+        bank = rng.choice(BANKS)
+        benefits = rng.sample(BENEFITS, rng.choice((1, 1, 2)))
+        card_rows.append((
+            f"{bank} {benefits[0]} Card {i}", rng.choice(("Visa", "Mastercard", "RuPay", "Amex")), ", ".join(benefits),
+            rng.choice((0, 500, 1000, 2500, None)), rng.choice((0, 499, 1000, 2500, None)),
+            rng.choice(("Reward points", "Cashback", "Air miles")), "Annual fee waived on spends of ₹1,00,000",
+            "Lounge access, fuel surcharge waiver", "Yes" if bank in PREFERRED else "No",
+            rng.choice((650, 700, 750, None)), rng.choice((300000, 600000, 1200000, 2400000, None)),
+        ))
+    conn.executemany("INSERT INTO CreditCards VALUES (?,?,?,?,?,?,?,?,?,?,?)", card_rows)
+
+    personas = []
+    for i in range(people):
+        persona = {
+            "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "aadhaar": f"{100000000000 + i * 7919:012d}",
+            "pan": _pan(rng, i),
+            "mobile": f"9{rng.randrange(10 ** 9):09d}",
+            "cibil": rng.randrange(620, 860),
+            "salary": rng.choice((360000, 720000, 1500000, 3000000)),
+        }
+        personas.append(persona)
+    conn.executemany("INSERT INTO pan VALUES (?,?,?)", [(p["pan"], p["cibil"], p["salary"]) for p in personas])
+    conn.executemany("INSERT INTO aadhaar VALUES (?,?,?)",
+                     [(p["aadhaar"], p["mobile"], f"{i + 1} MG Road, Bengaluru") for i, p in enumerate(personas)])
+    conn.executemany("INSERT INTO people VALUES (?,?,?)", [(p["name"], p["aadhaar"], p["pan"]) for p in personas])
+    conn.commit()
+    conn.close()
+    return personas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the benchmark SQLite fixture")
+    parser.add_argument("path")
+    parser.add_argument("--cards", type=int, default=300)
+    parser.add_argument("--people", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    create_fixture(args.path, args.cards, args.people, args.seed)
+    print(f"Wrote {args.cards} cards and {args.people} people to {args.path}")
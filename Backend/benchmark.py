@@ -0,0 +1,308 @@
+"""
+Load and latency benchmark for POST /chat. Replays scripted end-to-end applications (benefit selection
+through SendConfirmation) against the FastAPI app in-process, with a deterministic stub Gemini client
+that emits canned function calls and a synthetic SQLite copy of the bureau and card tables.
+
+    python benchmark.py --conversations 200 --concurrency 20 --llm-latency 0.05
+    FAST_PATH_ENABLED=0 python benchmark.py --json
+
+Reports requests/sec, latency percentiles, LLM calls per turn and DB queries per turn.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import re
+import socket
+import statistics
+import sys
+import tempfile
+import time
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark /chat with scripted conversations")
+    parser.add_argument("--conversations", type=int, default=50, help="Scripted applications to run")
+    parser.add_argument("--concurrency", type=int, default=10, help="Conversations in flight at once")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds added to every stub Gemini call")
+    parser.add_argument("--cards", type=int, default=300, help="Rows in the CreditCards fixture")
+    parser.add_argument("--people", type=int, default=200, help="Rows in the people/pan/aadhaar fixtures")
+    parser.add_argument("--warmup", type=int, default=1, help="Conversations run before measuring")
+    parser.add_argument("--db", help="SQLite fixture path (default: a temporary file)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    return parser.parse_args()
+
+
+ARGS = _parse_args() if __name__ == "__main__" else None
+if ARGS is not None:
+    # Must be in place before the app modules read their configuration at import time
+    _tmp = tempfile.mkdtemp(prefix="cc-bench-")
+    os.environ["LLM_STUB"] = "1"
+    os.environ["DB_BACKEND"] = "sqlite"
+    os.environ["SQLITE_DB_PATH"] = ARGS.db or os.path.join(_tmp, "bench.db")
+    os.environ.setdefault("SESSION_DB_PATH", os.path.join(_tmp, "sessions.db"))
+    os.environ.setdefault("OTP_DB_PATH", os.path.join(_tmp, "otp.db"))
+    os.environ.setdefault("EMAIL_STARTTLS", "0")
+    os.environ.setdefault("EMAIL_USER", "")
+    # Scripted users type with no think time; the per-session bucket would throttle them, not the server
+    os.environ.setdefault("SESSION_RATE_PER_SECOND", "0")
+
+from google.genai import types
+
+STATIC_AADHAAR_OTP = "197653"
+MAX_RETRIES = 3  # per message, after a 429
+CONFIRMATION_REPLY = "Your application has been submitted. A confirmation email is on its way."
+
+
+def conversation_script(persona: dict, benefit: str) -> list:
+    """User messages of one complete application; "{email_otp}" is filled in once the OTP has been issued."""
+    return [
+        "Hi, I'm looking for a credit card",
+        benefit,
+        "I'd like to apply for the first one",
+        persona["name"],
+        persona["aadhaar"],
+        STATIC_AADHAAR_OTP,
+        persona["email"],
+        "{email_otp}",
+        persona["pan"],
+        "Yes, I consent to the CIBIL check",
+        "I'll take the first card",
+        "Yes, that address is correct",
+    ]
+
+
+def _call(tool: str, **args) -> types.Part:
+    return types.Part(function_call=types.FunctionCall(name=tool, args=args))
+
+
+class ScriptedResponder:
+    """
+    Stub Gemini behaviour for the scripted conversations: picks the tool call(s) a well-behaved model
+    would make for the latest user message, or a canned reply once the tool results are in.
+    `persona_for(session)` maps the current session to its fixture persona.
+    """
+
+    def __init__(self, persona_for):
+        self.persona_for = persona_for
+
+    def __call__(self, contents, config):
+        from session_store import current_session_id
+        persona = self.persona_for(current_session_id.get())
+        last = contents[-1]
+        responses = [part.function_response for part in last.parts or [] if part.function_response]
+        if responses:
+            return self._after_tools(persona, responses, contents)
+        return self._for_message(persona, last.parts[0].text or "", contents)
+
+    @staticmethod
+    def _last_call(contents):
+        for content in reversed(contents):
+            for part in content.parts or []:
+                if part.function_call:
+                    return part.function_call
+        return None
+
+    def _for_message(self, persona: dict, text: str, contents):
+        text = text.strip()
+        if text == persona["aadhaar"]:
+            return [_call("VerifyAadhaarSendOtp", aadhaar=text)]
+        if re.fullmatch(r"\d{6}", text):
+            previous = self._last_call(contents)
+            if previous is not None and previous.name == "SendEmailOTP":
+                return [_call("VerifyEmailOTP", email=persona["email"], otp=text)]
+            return [_call("VerifyAadhaarOtp", aadhaar=persona["aadhaar"], otp=text)]
+        if text == persona["email"]:
+            return [_call("SendEmailOTP", email=text)]
+        if text == persona["pan"]:
+            return [_call("VerifyIdentity", name=persona["name"], aadhaar=persona["aadhaar"], pan=text)]
+        if text == persona["name"]:
+            return "Thank you. Please share your 12-digit Aadhaar number."
+        if text == persona["benefit"]:
+            return [_call("GetCreditCards", keyword_name=text)]
+        if "consent" in text:
+            return [_call("GetCibil", pan=persona["pan"]), _call("GetSalary", pan=persona["pan"])]
+        if "take the first" in text:
+            return [_call("GetAddress", aadhaar=persona["aadhaar"])]
+        if "address is correct" in text:
+            return [_call("SendConfirmation", email=persona["email"])]
+        if "apply" in text:
+            return "Great choice. May I have your full name as per your PAN card?"
+        return "I can help with Travel, Fuel, Groceries, Shopping, Dining, Lifestyle, Rewards, Entertainment or Student cards."
+
+    def _after_tools(self, persona: dict, responses, contents) -> str:
+        names = {response.name for response in responses}
+        if names == {"GetCibil", "GetSalary"}:
+            return [_call("GetValidCards", salary=persona["salary"], cibil=persona["cibil"],
+                          major_keyword=persona["benefit"])]
+        if "SendConfirmation" in names:
+            return CONFIRMATION_REPLY
+        result = responses[0].response or {}
+        return str(result.get("result", result.get("error", "")))[:300]
+
+
+def _percentile(samples: list, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class Benchmark:
+    def __init__(self, personas: list, llm_latency: float = 0.0):
+        import llm_agents
+        import main
+        from db_pool import pool
+        from mail_queue import mail_dispatcher
+        from fast_path import BENEFITS
+
+        self.llm_agents = llm_agents
+        self.app = main.app
+        self.pool = pool
+        self.mail_dispatcher = mail_dispatcher
+        self.personas = personas
+        self.benefits = BENEFITS
+        self.sessions = {}  # session_id -> persona
+        self.email_otps = {}
+        self.latencies = []
+        self.completed = 0
+        self.errors = 0
+        self.rejected = 0  # 429s from admission control, retried after Retry-After
+
+        llm_agents.client.responder = ScriptedResponder(self.sessions.get)
+        llm_agents.client.latency = llm_latency
+        # The email OTP is random; remember what was issued so the script can type it back
+        issue = llm_agents.generate_email_otp
+
+        def capture_email_otp(email):
+            result = issue(email)
+            self.email_otps[email] = result.get("otp")
+            return result
+        llm_agents.generate_email_otp = capture_email_otp
+
+    def _persona(self, index: int) -> dict:
+        persona = dict(self.personas[index % len(self.personas)])
+        persona["email"] = f"bench{index}@example.com"
+        persona["benefit"] = self.benefits[index % len(self.benefits)]
+        return persona
+
+    async def _conversation(self, transport, index: int, record: bool):
+        import httpx
+        # A client (cookie jar) per conversation, like separate browsers: /reset drops the session in the cookie
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+            persona = self._persona(index)
+            response = await http.post("/reset")
+            session_id = response.json()["session_id"]
+            self.sessions[session_id] = persona
+            reply = ""
+            for message in conversation_script(persona, persona["benefit"]):
+                if message == "{email_otp}":
+                    message = self.email_otps.get(persona["email"], "000000")
+                started = time.perf_counter()
+                response = await http.post("/chat", json={"input": message, "session_id": session_id})
+                for _ in range(MAX_RETRIES):
+                    if response.status_code != 429:
+                        break
+                    self.rejected += 1
+                    await asyncio.sleep(float(response.headers.get("Retry-After", "1")))
+                    response = await http.post("/chat", json={"input": message, "session_id": session_id})
+                elapsed = time.perf_counter() - started
+                if response.status_code != 200:
+                    self.errors += 1
+                    break
+                reply = response.json()["response"]
+                if record:
+                    self.latencies.append(elapsed)
+            if record and reply == CONFIRMATION_REPLY:
+                self.completed += 1
+            self.sessions.pop(session_id, None)
+
+    async def run(self, conversations: int, concurrency: int, warmup: int) -> dict:
+        import httpx
+        transport = httpx.ASGITransport(app=self.app)
+        for index in range(warmup):
+            await self._conversation(transport, index, record=False)
+
+        llm_before = self.llm_agents.client.calls
+        db_before = self.pool.metrics()["queries"]
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def bounded(index):
+            async with semaphore:
+                await self._conversation(transport, warmup + index, record=True)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(bounded(index) for index in range(conversations)))
+        wall = time.perf_counter() - started
+
+        turns = len(self.latencies)
+        return {
+            "conversations": conversations,
+            "completed": self.completed,
+            "errors": self.errors,
+            "rejected_429": self.rejected,
+            "concurrency": concurrency,
+            "turns": turns,
+            "wall_seconds": round(wall, 3),
+            "requests_per_second": round(turns / wall, 1) if wall else 0.0,
+            "latency_ms": {
+                "mean": round(1000 * statistics.fmean(self.latencies), 2) if turns else 0.0,
+                "p50": round(1000 * _percentile(self.latencies, 0.50), 2) if turns else 0.0,
+                "p90": round(1000 * _percentile(self.latencies, 0.90), 2) if turns else 0.0,
+                "p99": round(1000 * _percentile(self.latencies, 0.99), 2) if turns else 0.0,
+                "max": round(1000 * max(self.latencies), 2) if turns else 0.0,
+            },
+            "llm_calls_per_turn": round((self.llm_agents.client.calls - llm_before) / turns, 3) if turns else 0.0,
+            "db_queries_per_turn": round((self.pool.metrics()["queries"] - db_before) / turns, 3) if turns else 0.0,
+            "fast_path": dict(self.llm_agents.fast_path_router.stats),
+        }
+
+
+def print_report(report: dict):
+    latency = report["latency_ms"]
+    print(f"Conversations: {report['conversations']} ({report['completed']} completed, {report['errors']} errors, "
+          f"{report['rejected_429']} 429s retried), concurrency {report['concurrency']}")
+    print(f"Turns: {report['turns']} in {report['wall_seconds']}s -> {report['requests_per_second']} req/s")
+    print(f"Latency ms: mean {latency['mean']}  p50 {latency['p50']}  p90 {latency['p90']}  "
+          f"p99 {latency['p99']}  max {latency['max']}")
+    print(f"LLM calls/turn: {report['llm_calls_per_turn']}  DB queries/turn: {report['db_queries_per_turn']}")
+
+
+def main():
+    from bench_fixture import create_fixture
+    logging.disable(logging.INFO)
+    personas = create_fixture(os.environ["SQLITE_DB_PATH"], ARGS.cards, ARGS.people)
+
+    # Deliver the confirmation/OTP mails to a local sink when aiosmtpd is available
+    controller = None
+    try:
+        from aiosmtpd.controller import Controller
+
+        class _Sink:
+            async def handle_DATA(self, server, session, envelope):
+                return "250 OK"
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        controller = Controller(_Sink(), hostname="127.0.0.1", port=port)
+        controller.start()
+        os.environ.setdefault("EMAIL_HOST", "127.0.0.1")
+        os.environ.setdefault("EMAIL_PORT", str(port))
+    except ImportError:
+        print("aiosmtpd not installed: queued emails will fail to deliver in the background", file=sys.stderr)
+
+    bench = Benchmark(personas, ARGS.llm_latency)
+    # otp_simulator prints every OTP/mail it handles; keep the report readable
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        report = asyncio.run(bench.run(ARGS.conversations, ARGS.concurrency, ARGS.warmup))
+        bench.mail_dispatcher.stop()
+    if controller is not None:
+        controller.stop()
+    if ARGS.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
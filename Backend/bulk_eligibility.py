@@ -0,0 +1,136 @@
+"""
+Bulk pre-approval: screens a stream of PANs against the card catalog without going through chat.
+PANs are read in chunks, each chunk costs one `pan IN (...)` query and one vectorized threshold pass
+over the catalog, and results are written out as JSONL or CSV as they are produced, so memory stays
+bounded by the chunk size however long the input is.
+
+    python bulk_eligibility.py pans.txt --keyword Travel --format csv -o eligible.csv
+    cat pans.txt | python bulk_eligibility.py - --format jsonl
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import sys
+import logging
+from db_operations import get_pan_records, card_catalog
+logger = logging.getLogger("Bulk-Eligibility")
+
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+BULK_MAX_CARDS = int(os.getenv("BULK_MAX_CARDS", "10"))
+
+PAN_RE = re.compile(r"^[A-Z]{5}[0-9]{4}[A-Z]$")
+CSV_FIELDS = ("pan", "status", "eligible_count", "cards")
+
+
+def chunked(pans, size: int = BULK_CHUNK_SIZE):
+    chunk = []
+    for pan in pans:
+        chunk.append(pan)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def evaluate_chunk(pans: list[str], major_keyword: str = None, max_cards: int = BULK_MAX_CARDS) -> list[dict]:
+    """
+    One result per input PAN, in input order: status ok / not_found / invalid_pan plus the eligible cards.
+    The bureau values themselves (CIBIL, income) are only used for the check and never returned.
+    """
+    normalized = [(pan or "").strip().upper() for pan in pans]
+    valid = sorted({pan for pan in normalized if PAN_RE.match(pan)})
+    records = get_pan_records(valid)
+
+    found = [pan for pan in valid if pan in records]
+    row_of = {pan: i for i, pan in enumerate(found)}
+    if found:
+        cibils = [records[pan].get("CIBIL") for pan in found]
+        incomes = [records[pan].get("Annual_Income") for pan in found]
+        # A missing score or income can't clear any threshold
+        cards, mask = card_catalog.eligible_many(
+            [float("-inf") if v is None else v for v in cibils],
+            [float("-inf") if v is None else v for v in incomes],
+            major_keyword,
+        )
+        counts = mask.sum(axis=1)
+
+    results = []
+    for pan in normalized:
+        if not PAN_RE.match(pan):
+            results.append({"pan": pan, "status": "invalid_pan"})
+            continue
+        if pan not in row_of:
+            results.append({"pan": pan, "status": "not_found"})
+            continue
+        i = row_of[pan]
+        eligible = mask[i].nonzero()[0][:max_cards]
+        results.append({
+            "pan": pan,
+            "status": "ok",
+            "eligible_count": int(counts[i]),
+            "cards": [cards[j].get("card_name") for j in eligible],
+        })
+    return results
+
+
+def to_jsonl(results: list[dict]) -> str:
+    return "".join(json.dumps(result, ensure_ascii=False, separators=(",", ":")) + "\n" for result in results)
+
+
+def csv_header() -> str:
+    return ",".join(CSV_FIELDS) + "\r\n"
+
+
+def to_csv(results: list[dict]) -> str:
+    """CSV rows (no header); the eligible card names are joined with '|'."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for result in results:
+        writer.writerow([
+            result["pan"], result["status"], result.get("eligible_count", ""), "|".join(result.get("cards", [])),
+        ])
+    return buffer.getvalue()
+
+
+def read_pans(stream):
+    for line in stream:
+        for pan in line.replace(",", " ").split():
+            yield pan
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Screen PANs against the card catalog in bulk")
+    parser.add_argument("input", help="File with PANs (one per line, or comma/space separated); '-' for stdin")
+    parser.add_argument("--keyword", help="Only consider cards for this benefit, e.g. Travel")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default="jsonl")
+    parser.add_argument("--max-cards", type=int, default=BULK_MAX_CARDS, help="Eligible card names listed per PAN")
+    parser.add_argument("--chunk-size", type=int, default=BULK_CHUNK_SIZE, help="PANs per IN (...) query")
+    parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    sink = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    encode = to_csv if args.format == "csv" else to_jsonl
+    total = 0
+    try:
+        if args.format == "csv":
+            sink.write(csv_header())
+        for chunk in chunked(read_pans(source), args.chunk_size):
+            results = evaluate_chunk(chunk, args.keyword, args.max_cards)
+            sink.write(encode(results))
+            total += len(results)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+    logger.info(f"Screened {total} PANs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import os
+import threading
+import time
+import logging
+from bisect import bisect_right
+from lazy_imports import lazy_module
+np = lazy_module("numpy")
+import card_ranking
+from ttl_cache import TTLCache, MISSING
+logger = logging.getLogger("Card-Catalog")
+
+CARD_CATALOG_REFRESH_SECONDS = float(os.getenv("CARD_CATALOG_REFRESH_SECONDS", "3600"))
+CARD_CATALOG_RETRY_SECONDS = 60  # wait before retrying a failed background reload
+# Keyword -> matching card ids, per snapshot; keywords come from free text, so the cache is bounded
+CARD_MATCH_CACHE_SIZE = int(os.getenv("CARD_MATCH_CACHE_SIZE", "1024"))
+
+
+def _preferred_first(card: dict):
+    # Same order as the old SQL: preferred banks first, then by card name
+    return (0 if card.get("PreferredBank") == "Yes" else 1, (card.get("card_name") or "").casefold())
+
+
+class _Snapshot:
+    """Immutable view of the CreditCards table plus the lookup structures built from it."""
+
+    def __init__(self, rows: list[dict], version: int):
+        self.version = version
+        self.loaded_at = time.time()
+        self.cards = sorted(rows, key=_preferred_first)
+
+        self.benefit_text = [(card.get("major_benefit") or "").lower() for card in self.cards]
+
+        # Cards sorted by each threshold; a card's rank tells whether it sits below a bisect cut-off
+        self.cibil_keys, self.cibil_rank = self._threshold_order("MinCIBIL")
+        self.income_keys, self.income_rank = self._threshold_order("MinAnnualIncome")
+
+        self._match_cache = TTLCache(CARD_MATCH_CACHE_SIZE)
+        self._arrays = None
+
+    def arrays(self) -> dict:
+        """NumPy columns for thresholds and ranking in catalog order (see card_ranking), built on first use."""
+        if self._arrays is None:
+            self._arrays = card_ranking.build_columns(self.cards)
+        return self._arrays
+
+    def _threshold_order(self, column: str):
+        # NULL thresholds never matched in SQL, so they sort past every possible value
+        values = [card.get(column) for card in self.cards]
+        values = [float("inf") if v is None else v for v in values]
+        order = sorted(range(len(values)), key=values.__getitem__)
+        keys = [values[i] for i in order]
+        rank = [0] * len(self.cards)
+        for position, idx in enumerate(order):
+            rank[idx] = position
+        return keys, rank
+
+    def match(self, keyword: str) -> tuple:
+        """
+        Card ids whose major_benefit contains keyword (case-insensitive), in catalog order. Same
+        substring semantics as the old `LIKE '%keyword%'`, so this is a linear scan over the catalog;
+        the few distinct keywords make the per-snapshot cache absorb almost every call.
+        """
+        keyword = (keyword or "").strip().lower()
+        cached = self._match_cache.get(keyword)
+        if cached is not MISSING:
+            return cached
+        result = tuple(idx for idx, text in enumerate(self.benefit_text) if keyword in text)
+        self._match_cache.set(keyword, result)
+        return result
+
+
+class CardCatalog:
+    """
+    In-memory copy of the CreditCards table. Loaded once through `loader` and reloaded
+    every `refresh_interval` seconds or on an explicit refresh(). Only the first load blocks the
+    caller; a stale snapshot keeps being served while a background thread reloads it.
+    """
+
+    def __init__(self, loader, refresh_interval: float = CARD_CATALOG_REFRESH_SECONDS):
+        self.loader = loader
+        self.refresh_interval = refresh_interval
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._background = threading.Lock()  # held while a background reload runs
+        self._next_refresh_at = 0.0
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version if self._snapshot else 0
+
+    def current_version(self) -> int:
+        """Version of the snapshot queries are served from, loading it on first use."""
+        return self._current().version
+
+    def add_refresh_listener(self, callback):
+        """callback(version) runs after every successful reload."""
+        self._listeners.append(callback)
+
+    def refresh(self):
+        self._reload()
+
+    def _reload(self, first: bool = False):
+        with self._lock:
+            if first and self._snapshot is not None:
+                return  # another caller finished the first load while this one waited for the lock
+            rows = self.loader()
+            self._snapshot = _Snapshot(rows, self.version + 1)
+            self._next_refresh_at = self._snapshot.loaded_at + self.refresh_interval
+            version = self._snapshot.version
+        logger.info(f"Card catalog loaded: {len(rows)} cards (version {version})")
+        for callback in self._listeners:
+            try:
+                callback(version)
+            except Exception as e:
+                logger.error(f"Catalog refresh listener failed: {e}")
+
+    def _current(self) -> _Snapshot:
+        snapshot = self._snapshot
+        if snapshot is None:
+            self._reload(first=True)
+            return self._snapshot
+        if time.time() > self._next_refresh_at and self._background.acquire(blocking=False):
+            threading.Thread(target=self._background_refresh, name="catalog-refresh", daemon=True).start()
+        return snapshot
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            self._next_refresh_at = time.time() + min(CARD_CATALOG_RETRY_SECONDS, self.refresh_interval)
+            logger.error(f"Card catalog refresh failed, serving version {self.version}: {e}")
+        finally:
+            self._background.release()
+
+    def search(self, major_keyword: str) -> list[dict]:
+        snapshot = self._current()
+        return [snapshot.cards[i] for i in snapshot.match(major_keyword)]
+
+    def eligible(self, salary: float, cibil: int, major_keyword: str) -> list[dict]:
+        """Cards for the benefit whose MinCIBIL <= cibil and MinAnnualIncome <= salary."""
+        snapshot = self._current()
+        cibil_cut = bisect_right(snapshot.cibil_keys, cibil)
+        income_cut = bisect_right(snapshot.income_keys, salary)
+        return [
+            snapshot.cards[i] for i in snapshot.match(major_keyword)
+            if snapshot.cibil_rank[i] < cibil_cut and snapshot.income_rank[i] < income_cut
+        ]
+
+    def eligible_many(self, cibils, salaries, major_keyword: str = None):
+        """
+        Vectorized eligible() for many profiles at once. Returns (cards, mask) where `cards` are the
+        benefit's cards in catalog order (all cards if no keyword) and mask[i, j] is True when
+        profile i passes both thresholds of cards[j].
+        """
+        snapshot = self._current()
+        ids = snapshot.match(major_keyword) if major_keyword else tuple(range(len(snapshot.cards)))
+        arrays = snapshot.arrays()
+        index = np.fromiter(ids, dtype=np.intp, count=len(ids))
+        cibils = np.asarray(cibils, dtype=np.float64)[:, None]
+        salaries = np.asarray(salaries, dtype=np.float64)[:, None]
+        mask = (arrays["MinCIBIL"][index][None, :] <= cibils) & (arrays["MinAnnualIncome"][index][None, :] <= salaries)
+        return [snapshot.cards[i] for i in ids], mask
+
+    def ranked(self, major_keyword: str, k: int = None, salary: float = None, cibil: int = None,
+               weights: dict = card_ranking.DEFAULT_WEIGHTS) -> tuple:
+        """
+        (top k cards best first, number of candidates) for the benefit. With salary and cibil only
+        cards the profile qualifies for are ranked; k=None ranks them all.
+        """
+        snapshot = self._current()
+        ids = snapshot.match(major_keyword)
+        index = np.fromiter(ids, dtype=np.intp, count=len(ids))
+        scores = card_ranking.score(snapshot.arrays(), index, weights, cibil, salary)
+        order = card_ranking.top_k(scores, k)
+        total = int(np.isfinite(scores).sum())
+        return [snapshot.cards[ids[i]] for i in order], total
+
+    def eligibility_bucket(self, salary: float, cibil: int) -> tuple:
+        """
+        (version, cibil cut, income cut): profiles with the same bucket pass exactly the same
+        thresholds, so eligible() returns the same cards for them.
+        """
+        snapshot = self._current()
+        return (
+            snapshot.version,
+            bisect_right(snapshot.cibil_keys, cibil),
+            bisect_right(snapshot.income_keys, salary),
+        )
+
+    def __len__(self):
+        return len(self._current().cards)
@@ -0,0 +1,95 @@
+"""
+Vectorized card ranking. The catalog snapshot keeps its cards as NumPy columns (thresholds, fees,
+preferred flag, bank priority); a weighted score for a benefit's cards and a user profile is computed
+in one pass and the top k are picked with argpartition, ties broken by catalog order so the ranking
+is deterministic.
+"""
+import os
+from lazy_imports import lazy_module
+np = lazy_module("numpy")
+
+# Priority order used for the `bank` score; matches the preferred banks listed in prompt.txt
+PREFERRED_BANKS = ("HDFC", "Axis", "ICICI", "SBI", "Standard Chartered", "American Express")
+# preferred: PreferredBank flag, bank: position in PREFERRED_BANKS, fee: lower joining + annual fee,
+# headroom: how far the profile clears MinCIBIL / MinAnnualIncome (0 keeps rankings cacheable per bucket)
+RANKING_WEIGHTS = os.getenv("RANKING_WEIGHTS", "preferred=4,bank=1,fee=2,headroom=0")
+RANKING_TOP_K = int(os.getenv("RANKING_TOP_K", "20"))
+
+
+def parse_weights(spec: str) -> dict:
+    weights = {"preferred": 0.0, "bank": 0.0, "fee": 0.0, "headroom": 0.0}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = item.partition("=")
+        if name.strip() not in weights:
+            raise ValueError(f"Unknown ranking weight {name!r} in {spec!r}")
+        weights[name.strip()] = float(value)
+    return weights
+
+
+DEFAULT_WEIGHTS = parse_weights(RANKING_WEIGHTS)
+
+
+def profile_dependent(weights: dict = DEFAULT_WEIGHTS) -> bool:
+    """True if scores depend on the exact CIBIL/salary, not just on which thresholds they pass."""
+    return weights.get("headroom", 0.0) != 0.0
+
+
+def _bank_priority(card_name: str) -> float:
+    name = (card_name or "").casefold()
+    for position, bank in enumerate(PREFERRED_BANKS):
+        if name.startswith(bank.casefold()):
+            return 1.0 - position / len(PREFERRED_BANKS)
+    return 0.0
+
+
+def _column(cards: list[dict], key: str, missing: float) -> "np.ndarray":
+    return np.array([missing if card.get(key) is None else float(card[key]) for card in cards], dtype=np.float64)
+
+
+def build_columns(cards: list[dict]) -> dict:
+    """Columnar view of the cards in catalog order. NULL thresholds become inf so they never pass."""
+    joining = _column(cards, "joining_fee", np.nan)
+    annual = _column(cards, "annual_fee", np.nan)
+    total_fee = joining + annual
+    known = total_fee[~np.isnan(total_fee)]
+    fee_cap = float(known.max()) if known.size and known.max() > 0 else 1.0
+    # Unknown fees rank like the most expensive card (the old 999999 sentinel put them last)
+    fee_score = 1.0 - np.clip(np.nan_to_num(total_fee, nan=fee_cap) / fee_cap, 0.0, 1.0)
+    return {
+        "MinCIBIL": _column(cards, "MinCIBIL", np.inf),
+        "MinAnnualIncome": _column(cards, "MinAnnualIncome", np.inf),
+        "fee_score": fee_score,
+        "preferred": np.array([card.get("PreferredBank") == "Yes" for card in cards], dtype=np.float64),
+        "bank": np.array([_bank_priority(card.get("card_name")) for card in cards], dtype=np.float64),
+    }
+
+
+def score(columns: dict, index: "np.ndarray", weights: dict = DEFAULT_WEIGHTS,
+          cibil: float = None, salary: float = None) -> "np.ndarray":
+    """Weighted score of the cards at `index`; with a profile, cards it doesn't qualify for get -inf."""
+    scores = (weights["preferred"] * columns["preferred"][index]
+              + weights["bank"] * columns["bank"][index]
+              + weights["fee"] * columns["fee_score"][index])
+    if cibil is None or salary is None:
+        return scores
+    min_cibil = columns["MinCIBIL"][index]
+    min_income = columns["MinAnnualIncome"][index]
+    if weights["headroom"]:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cibil_room = np.clip((cibil - min_cibil) / 150.0, 0.0, 1.0)
+            income_room = np.clip(np.log2(np.maximum(salary, 1.0) / np.maximum(min_income, 1.0)) / 3.0, 0.0, 1.0)
+        scores = scores + weights["headroom"] * np.nan_to_num(0.5 * cibil_room + 0.5 * income_room)
+    return np.where((min_cibil <= cibil) & (min_income <= salary), scores, -np.inf)
+
+
+def top_k(scores: "np.ndarray", k: int = None) -> "np.ndarray":
+    """Positions of the k best finite scores, best first; equal scores keep their catalog order."""
+    candidates = np.flatnonzero(np.isfinite(scores))
+    if k is not None and 0 < k < candidates.size:
+        picked = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        # argpartition splits ties at the boundary arbitrarily; settle them by catalog position
+        boundary = scores[picked].min()
+        better = candidates[scores[candidates] > boundary]
+        tied = candidates[scores[candidates] == boundary][:k - better.size]
+        candidates = np.concatenate((better, tied))
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
@@ -0,0 +1,104 @@
+import json
+import os
+import logging
+from lazy_imports import lazy_module
+types = lazy_module("google.genai.types")
+logger = logging.getLogger("Conversation")
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "6000"))
+HISTORY_SUMMARY_MAX_CHARS = int(os.getenv("HISTORY_SUMMARY_MAX_CHARS", "1200"))
+
+
+def estimate_tokens(message: dict) -> int:
+    return max(1, len(json.dumps(message.get("parts", []), ensure_ascii=False)) // 4)
+
+
+def is_turn_start(message: dict) -> bool:
+    """A turn starts with a user message carrying text (function responses also use the user role)."""
+    return message.get("role") == "user" and any("text" in part for part in message.get("parts", []))
+
+
+def split_turns(history: list[dict]) -> list[list[dict]]:
+    """Groups stored messages into turns so a function call is never separated from its response."""
+    turns = []
+    for message in history:
+        if is_turn_start(message) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def _summary_lines(turn: list[dict]) -> list[str]:
+    lines = []
+    for message in turn:
+        for part in message.get("parts", []):
+            if "text" in part and part["text"]:
+                speaker = "User" if message["role"] == "user" else "AI"
+                text = " ".join(part["text"].split())
+                lines.append(f"{speaker}: {text[:150]}")
+            elif "function_call" in part:
+                lines.append(f"AI called {part['function_call'].get('name')}")
+            elif "function_response" in part:
+                result = str(part["function_response"].get("response", {}).get("result", ""))
+                lines.append(f"{part['function_response'].get('name')} returned: {' '.join(result.split())[:150]}")
+    return lines
+
+
+def summarize_turns(turns: list[list[dict]], max_chars: int = HISTORY_SUMMARY_MAX_CHARS) -> str:
+    """Cheap extractive summary of dropped turns, keeping the most recent lines that fit."""
+    lines = [line for turn in turns for line in _summary_lines(turn)]
+    kept, size = [], 0
+    for line in reversed(lines):
+        if size + len(line) > max_chars:
+            break
+        kept.append(line)
+        size += len(line) + 1
+    return "Summary of the earlier conversation:\n" + "\n".join(reversed(kept))
+
+
+def window(history: list[dict], token_budget: int = HISTORY_TOKEN_BUDGET) -> "list[types.Content]":
+    """Newest whole turns that fit the token budget; older turns are folded into one summary message."""
+    turns = split_turns(history)
+    kept, used = [], 0
+    for turn in reversed(turns):
+        cost = sum(estimate_tokens(m) for m in turn)
+        if kept and used + cost > token_budget:
+            break
+        kept.append(turn)
+        used += cost
+    kept.reverse()
+
+    contents = []
+    dropped = turns[:len(turns) - len(kept)]
+    if dropped:
+        logger.debug(f"History window dropped {len(dropped)} turns, kept {len(kept)} (~{used} tokens)")
+        contents.append(types.Content(role="user", parts=[types.Part(text=summarize_turns(dropped))]))
+    for turn in kept:
+        contents.extend(types.Content.model_validate(message) for message in turn)
+    return contents
+
+
+class ConversationBuilder:
+    """
+    Typed multi-turn contents for one agent turn: the windowed session history followed by
+    the messages appended during this turn (user input, function calls and responses, answer).
+    """
+
+    def __init__(self, history: list[dict], token_budget: int = HISTORY_TOKEN_BUDGET):
+        self._window = window(history, token_budget)
+        self._new = []
+
+    def append(self, content: "types.Content"):
+        self._new.append(content)
+
+    def contents(self) -> "list[types.Content]":
+        return self._window + self._new
+
+    def finish(self, output: str):
+        """Makes sure the turn ends with a model text message, e.g. when a tool error short-circuited it."""
+        last = self._new[-1] if self._new else None
+        if last is None or last.role != "model" or not any(part.text for part in last.parts or []):
+            self.append(types.Content(role="model", parts=[types.Part(text=output)]))
+
+    def new_messages(self) -> list[dict]:
+        return [content.model_dump(mode="json", exclude_none=True) for content in self._new]
@@ -1,173 +1,207 @@
-import mysql.connector
-from decimal import Decimal
-import re
-import logging
-logger = logging.getLogger("DB-ops")
-
-def clean_for_json(obj):
-    """Recursively convert Decimals to floats and ensure Gemini-safe outputs."""
-    if isinstance(obj, Decimal):
-        return float(obj)
-    elif isinstance(obj, dict):
-        return {k: clean_for_json(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [clean_for_json(i) for i in obj]
-    return obj
-
-def _extract_mobile_from_row(row):
-    """Accept row as dict or string and return mobile string or None."""
-    if row is None:
-        return None
-    # If row is already a plain string/int
-    if isinstance(row, (str, int)):
-        return str(row)
-    # If dict-like, accept multiple key casings
-    if isinstance(row, dict):
-        # common variants
-        for key in ("mobile", "Mobile", "MOBILE", "phone", "Phone", "PHONE"):
-            if key in row and row[key] not in (None, ""):
-                return str(row[key])
-        # Sometimes the row is like {"Mobile": "6100..."} inside nested structures:
-        # try to find first string value that looks like phone digits
-        for v in row.values():
-            if isinstance(v, (str, int)):
-                s = re.sub(r"\D", "", str(v))
-                if len(s) >= 6:
-                    return s
-    # Not found
-    return None
-
-DB_CONFIG = {
-    "host": "", #<--MySQL workbench host
-    "user": "", #<--MySQL workbench user
-    "password": "", #<--MySQL workbench user password
-    "database": "credit_cards"
-}
-
-def get_connection():
-    return mysql.connector.connect(**DB_CONFIG)
-
-def search_credit_cards(major_keyword: str):
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    query = """
-    SELECT card_name, payment_network, major_benefit, joining_fee, annual_fee, 
-           reward_method, fee_waiver, other_benefits, PreferredBank, MinCIBIL, MinAnnualIncome
-    FROM CreditCards
-    WHERE major_benefit LIKE %s
-    ORDER BY 
-        CASE WHEN PreferredBank = 'Yes' THEN 1 ELSE 2 END,
-        card_name;
-    """
-    cursor.execute(query, ('%' + major_keyword + '%',))
-    rows = cursor.fetchall()
-    conn.close()
-    return clean_for_json(rows) 
-
-def get_mobile_by_aadhaar(aadhaar: str):
-    """
-    Query DB and return the mobile number (string) linked to Aadhaar.
-    Returns None if not found.
-    """
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    query = "SELECT Mobile FROM Aadhaar WHERE AadhaarID = %s LIMIT 1"
-    cursor.execute(query, (aadhaar,))
-    result = cursor.fetchone()
-    conn.close()
-
-    logger.debug(f"[get_mobile_by_aadhaar] DB raw result for {aadhaar}: {result!r}")
-    mobile = _extract_mobile_from_row(result)
-
-    if mobile:
-        # normalize to digits-only
-        mobile_digits = re.sub(r'\D', '', mobile)
-        if mobile_digits:
-            return mobile_digits
-    return None
-    
-def verify_identity_records(name: str, aadhaar: str, pan: str) -> bool:
-    """Verifies if the given Aadhaar and PAN belong to the same user."""
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    query = """
-    SELECT 1 FROM people
-    WHERE LOWER(Name) = LOWER(%s) AND aadhaarID = %s AND panID = %s
-    LIMIT 1
-    """
-    cursor.execute(query, (name, aadhaar, pan))
-    row = cursor.fetchone()
-    conn.close()
-
-    # Return True if a record exists, else False
-    found = row is not None
-    logger.info(f"Identity check for {name}, {aadhaar}, {pan}: {'Match' if found else 'No match'}")
-    return found
-
-def get_cibil_score_by_pan(pan: str) -> int:
-    """Fetch the CIBIL score of the user with given pan number."""
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    query = """
-    SELECT CIBIL FROM pan
-    WHERE panID = %s
-    """
-    cursor.execute(query, (pan,))
-    result = cursor.fetchone()
-    conn.close()
-    return clean_for_json(result["CIBIL"]) if result else -1
-
-def get_address_from_aadhaar(aadhaar: str)-> str:
-    """Fetch the address of the user with given aadhaar number."""
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    query = """
-    SELECT address FROM aadhaar
-    WHERE aadhaarID = %s
-    """
-    cursor.execute(query, (aadhaar,))   
-    result = cursor.fetchone()
-    conn.close()
-    return clean_for_json(result["address"]) if result else ""
-
-def get_salary_from_pan(pan: str) -> str:
-    """Fetch the annual income of the user with the given PAN number."""
-    try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-        query = """
-        SELECT Annual_Income FROM pan
-        WHERE panID = %s
-        """
-        cursor.execute(query, (pan,))
-        result = cursor.fetchone()
-        conn.close()
-
-        if result and "Annual_Income" in result:
-            return clean_for_json(result["Annual_Income"])
-        else:
-            return -1
-    except Exception as e:
-        logger.exception(f"Error in get_salary_from_pan: {e}")
-        return -1
-    
-    
-def get_valid_cards(salary:float, cibil:int, major_keyword:str)->list[dict]:
-    """Fetch cards with minimum requirements equal to or more than CIBIL and salary of user"""
-    conn= get_connection()
-    cursor = conn.cursor(dictionary=True)
-    query = """
-    SELECT card_name, payment_network, major_benefit, joining_fee, annual_fee, 
-           reward_method, fee_waiver, other_benefits, PreferredBank, MinCIBIL, MinAnnualIncome
-    FROM CreditCards
-    WHERE major_benefit LIKE %s AND MinCIBIL <= %s AND MinAnnualIncome <= %s
-    ORDER BY 
-        CASE WHEN PreferredBank = 'Yes' THEN 1 ELSE 2 END,
-        card_name;
-    """
-    cursor.execute(query, ('%' + major_keyword + '%', int(cibil), float(salary)))
-    rows = cursor.fetchall()
-    conn.close()
-
-    return clean_for_json(rows)
+from db_pool import pool
+from card_catalog import CardCatalog
+from ttl_cache import TTLCache
+from session_store import current_session_id
+from prefetch import Prefetcher
+from decimal import Decimal
+import os
+import re
+import logging
+logger = logging.getLogger("DB-ops")
+
+BUREAU_CACHE_SIZE = int(os.getenv("BUREAU_CACHE_SIZE", "10000"))
+BUREAU_CACHE_TTL_SECONDS = float(os.getenv("BUREAU_CACHE_TTL_SECONDS", "600"))
+PREFETCH_TTL_SECONDS = float(os.getenv("PREFETCH_TTL_SECONDS", "300"))
+
+# (session_id, table, key) -> row; repeated PAN/Aadhaar lookups within one application skip MySQL
+bureau_cache = TTLCache(BUREAU_CACHE_SIZE, BUREAU_CACHE_TTL_SECONDS)
+# Loads the applicant's pan + aadhaar rows in the background once their identity is verified
+profile_prefetcher = Prefetcher()
+
+def clean_for_json(obj):
+    """Recursively convert Decimals to floats and ensure Gemini-safe outputs."""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    elif isinstance(obj, dict):
+        return {k: clean_for_json(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [clean_for_json(i) for i in obj]
+    return obj
+
+def _extract_mobile_from_row(row):
+    """Accept row as dict or string and return mobile string or None."""
+    if row is None:
+        return None
+    # If row is already a plain string/int
+    if isinstance(row, (str, int)):
+        return str(row)
+    # If dict-like, accept multiple key casings
+    if isinstance(row, dict):
+        # common variants
+        for key in ("mobile", "Mobile", "MOBILE", "phone", "Phone", "PHONE"):
+            if key in row and row[key] not in (None, ""):
+                return str(row[key])
+        # Sometimes the row is like {"Mobile": "6100..."} inside nested structures:
+        # try to find first string value that looks like phone digits
+        for v in row.values():
+            if isinstance(v, (str, int)):
+                s = re.sub(r"\D", "", str(v))
+                if len(s) >= 6:
+                    return s
+    # Not found
+    return None
+
+def load_credit_cards() -> list[dict]:
+    """Reads the whole CreditCards table; used to (re)build the in-memory card catalog."""
+    query = """
+    SELECT card_name, payment_network, major_benefit, joining_fee, annual_fee, 
+           reward_method, fee_waiver, other_benefits, PreferredBank, MinCIBIL, MinAnnualIncome
+    FROM CreditCards
+    """
+    return clean_for_json(pool.fetch_all(query))
+
+card_catalog = CardCatalog(load_credit_cards)
+
+def search_credit_cards(major_keyword: str):
+    """Cards whose major benefit contains the keyword, preferred banks first. Served from the catalog."""
+    return card_catalog.search(major_keyword)
+
+def rank_credit_cards(major_keyword: str, k: int = None, salary: float = None, cibil: int = None):
+    """(top k cards best first, candidate count) by the weighted score in card_ranking; with salary and
+    cibil only eligible cards are ranked."""
+    return card_catalog.ranked(major_keyword, k, None if salary is None else float(salary),
+                               None if cibil is None else int(cibil))
+
+def get_pan_record(pan: str):
+    """CIBIL and Annual_Income for a PAN in one row fetch, cached per session. None if not found."""
+    profile_prefetcher.wait(current_session_id.get())
+    def load():
+        query = """
+        SELECT CIBIL, Annual_Income FROM pan
+        WHERE panID = %s
+        """
+        return pool.fetch_one(query, (pan,))
+    return bureau_cache.get_or_load((current_session_id.get(), "pan", pan), load)
+
+def get_pan_records(pans: list[str]) -> dict:
+    """PAN -> {CIBIL, Annual_Income} for a batch of PANs in one IN (...) query; unknown PANs are absent. Uncached."""
+    if not pans:
+        return {}
+    query = f"SELECT panID, CIBIL, Annual_Income FROM pan WHERE panID IN ({', '.join(['%s'] * len(pans))})"
+    return {row["panID"]: clean_for_json(row) for row in pool.fetch_all(query, tuple(pans))}
+
+def get_aadhaar_record(aadhaar: str):
+    """Mobile and address for an Aadhaar in one row fetch, cached per session. None if not found."""
+    profile_prefetcher.wait(current_session_id.get())
+    def load():
+        query = """
+        SELECT Mobile, address FROM aadhaar
+        WHERE aadhaarID = %s
+        LIMIT 1
+        """
+        return pool.fetch_one(query, (aadhaar,))
+    return bureau_cache.get_or_load((current_session_id.get(), "aadhaar", aadhaar), load)
+
+def load_profile(aadhaar: str, pan: str):
+    """The people row joined with its pan and aadhaar rows in one query. None if the pair is not on record."""
+    query = """
+    SELECT pe.Name, pa.CIBIL, pa.Annual_Income, aa.Mobile, aa.address
+    FROM people pe
+    LEFT JOIN pan pa ON pa.panID = pe.panID
+    LEFT JOIN aadhaar aa ON aa.aadhaarID = pe.aadhaarID
+    WHERE pe.aadhaarID = %s AND pe.panID = %s
+    LIMIT 1
+    """
+    return pool.fetch_one(query, (aadhaar, pan))
+
+def prefetch_profile(aadhaar: str, pan: str) -> bool:
+    """
+    Starts loading the current session's bureau profile in the background. The pan and aadhaar rows are
+    seeded into the bureau cache (PREFETCH_TTL_SECONDS), so GetCibil / GetSalary / GetAddress skip MySQL.
+    """
+    session_id = current_session_id.get()
+
+    def publish(profile):
+        if not profile:
+            return
+        if profile.get("CIBIL") is not None or profile.get("Annual_Income") is not None:
+            bureau_cache.set((session_id, "pan", pan),
+                             {"CIBIL": profile.get("CIBIL"), "Annual_Income": profile.get("Annual_Income")},
+                             PREFETCH_TTL_SECONDS)
+        if profile.get("Mobile") is not None or profile.get("address") is not None:
+            bureau_cache.set((session_id, "aadhaar", aadhaar),
+                             {"Mobile": profile.get("Mobile"), "address": profile.get("address")},
+                             PREFETCH_TTL_SECONDS)
+        logger.debug(f"Prefetched bureau profile for session {session_id}")
+    return profile_prefetcher.start(session_id, load_profile, publish, aadhaar, pan)
+
+def invalidate_bureau_cache(session_id: str = None, pan: str = None, aadhaar: str = None) -> int:
+    """Drops cached bureau rows for a session and/or a specific PAN or Aadhaar."""
+    def matches(key):
+        key_session, table, value = key
+        if session_id is not None and key_session != session_id:
+            return False
+        if pan is not None or aadhaar is not None:
+            return (table == "pan" and value == pan) or (table == "aadhaar" and value == aadhaar)
+        return True
+    return bureau_cache.invalidate(matches)
+
+def get_mobile_by_aadhaar(aadhaar: str):
+    """
+    Query DB and return the mobile number (string) linked to Aadhaar.
+    Returns None if not found.
+    """
+    record = get_aadhaar_record(aadhaar)
+    result = {"Mobile": record.get("Mobile")} if record else None
+
+    logger.debug(f"[get_mobile_by_aadhaar] DB raw result for {aadhaar}: {result!r}")
+    mobile = _extract_mobile_from_row(result)
+
+    if mobile:
+        # normalize to digits-only
+        mobile_digits = re.sub(r'\D', '', mobile)
+        if mobile_digits:
+            return mobile_digits
+    return None
+    
+def verify_identity_records(name: str, aadhaar: str, pan: str) -> bool:
+    """Verifies if the given Aadhaar and PAN belong to the same user."""
+    query = """
+    SELECT 1 FROM people
+    WHERE LOWER(Name) = LOWER(%s) AND aadhaarID = %s AND panID = %s
+    LIMIT 1
+    """
+    row = pool.fetch_one(query, (name, aadhaar, pan))
+
+    # Return True if a record exists, else False
+    found = row is not None
+    logger.info(f"Identity check for {name}, {aadhaar}, {pan}: {'Match' if found else 'No match'}")
+    return found
+
+def get_cibil_score_by_pan(pan: str) -> int:
+    """Fetch the CIBIL score of the user with given pan number."""
+    result = get_pan_record(pan)
+    return clean_for_json(result["CIBIL"]) if result else -1
+
+def get_address_from_aadhaar(aadhaar: str)-> str:
+    """Fetch the address of the user with given aadhaar number."""
+    result = get_aadhaar_record(aadhaar)
+    return clean_for_json(result["address"]) if result else ""
+
+def get_salary_from_pan(pan: str) -> str:
+    """Fetch the annual income of the user with the given PAN number."""
+    try:
+        result = get_pan_record(pan)
+
+        if result and "Annual_Income" in result:
+            return clean_for_json(result["Annual_Income"])
+        else:
+            return -1
+    except Exception as e:
+        logger.exception(f"Error in get_salary_from_pan: {e}")
+        return -1
+    
+    
+def get_valid_cards(salary:float, cibil:int, major_keyword:str)->list[dict]:
+    """Fetch cards with minimum requirements equal to or more than CIBIL and salary of user"""
+    return card_catalog.eligible(float(salary), int(cibil), major_keyword)
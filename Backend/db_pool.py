@@ -0,0 +1,254 @@
+import os
+import re
+import queue
+import sqlite3
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from tracing import span
+logger = logging.getLogger("DB-pool")
+
+DB_CONFIG = {
+    "host": "", #<--MySQL workbench host
+    "user": "", #<--MySQL workbench user
+    "password": "", #<--MySQL workbench user password
+    "database": "credit_cards"
+}
+
+DB_BACKEND = os.getenv("DB_BACKEND", "mysql")  # "mysql" or "sqlite"
+SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", "credit_cards.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_HEALTH_CHECK_INTERVAL = float(os.getenv("DB_HEALTH_CHECK_INTERVAL", "30"))
+
+_TABLE_RE = re.compile(r"\bFROM\s+(\w+)", re.I)  # table label for query spans
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+class MySQLBackend:
+    """Opens mysql.connector connections and returns rows as dicts."""
+    name = "mysql"
+
+    def __init__(self, config: dict):
+        self.config = config
+
+    def connect(self):
+        import mysql.connector
+        # Pooled connections live long: without autocommit each one would keep the REPEATABLE READ
+        # snapshot of its first SELECT and never see catalog updates or newly added applicants
+        return mysql.connector.connect(**self.config, autocommit=True)
+
+    def cursor(self, conn):
+        return conn.cursor(dictionary=True)
+
+    def ping(self, conn) -> bool:
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def is_connection_error(self, exc: Exception) -> bool:
+        import mysql.connector
+        return isinstance(exc, (mysql.connector.InterfaceError, mysql.connector.OperationalError))
+
+
+class _SQLiteCursor:
+    """Wraps a sqlite3 cursor so the MySQL-style %s queries in db_operations run unchanged."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query: str, params=()):
+        return self._cursor.execute(query.replace("%s", "?"), params)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+
+def _dict_row(cursor, row):
+    return {col[0]: row[i] for i, col in enumerate(cursor.description)}
+
+
+class SQLiteBackend:
+    """Local SQLite file with the same tables, for offline runs and tests."""
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = _dict_row
+        return conn
+
+    def cursor(self, conn):
+        return _SQLiteCursor(conn.cursor())
+
+    def ping(self, conn) -> bool:
+        try:
+            conn.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def is_connection_error(self, exc: Exception) -> bool:
+        # OperationalError also covers bad SQL in sqlite3, so only treat closed/unusable handles as broken
+        return isinstance(exc, (sqlite3.ProgrammingError, sqlite3.InterfaceError))
+
+
+class ConnectionPool:
+    """Fixed-size pool of reusable DB connections with health checks and usage metrics."""
+
+    def __init__(self, backend, size: int = DB_POOL_SIZE, timeout: float = DB_POOL_TIMEOUT,
+                 health_check_interval: float = DB_HEALTH_CHECK_INTERVAL):
+        self.backend = backend
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._idle = queue.LifoQueue()  # (conn, last_used)
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._metrics = {
+            "created": 0,
+            "closed": 0,
+            "checkouts": 0,
+            "reconnects": 0,
+            "health_check_failures": 0,
+            "query_errors": 0,
+            "queries": 0,
+            "wait_seconds_total": 0.0,
+            "in_use": 0,
+        }
+
+    def _count(self, key: str, amount=1):
+        with self._lock:
+            self._metrics[key] += amount
+
+    def _open(self):
+        conn = self.backend.connect()
+        self._count("created")
+        return conn
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self._count("closed")
+
+    def acquire(self):
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolExhausted(f"No DB connection available within {self.timeout}s (pool size {self.size})")
+        try:
+            conn = None
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            if conn is not None and time.time() - last_used > self.health_check_interval:
+                if not self.backend.ping(conn):
+                    logger.warning("Pooled connection failed health check, reconnecting")
+                    self._count("health_check_failures")
+                    self._close(conn)
+                    conn = None
+                    self._count("reconnects")
+            if conn is None:
+                conn = self._open()
+        except Exception:
+            self._slots.release()
+            raise
+        self._count("checkouts")
+        self._count("in_use")
+        self._count("wait_seconds_total", time.perf_counter() - started)
+        return conn
+
+    def release(self, conn, broken: bool = False):
+        self._count("in_use", -1)
+        if broken:
+            self._close(conn)
+        else:
+            self._idle.put((conn, time.time()))
+        self._slots.release()
+
+    @contextmanager
+    def cursor(self):
+        """Yields a dict cursor; the cursor is closed and the connection returned even on error."""
+        conn = self.acquire()
+        broken = False
+        cursor = None
+        try:
+            cursor = self.backend.cursor(conn)
+            yield cursor
+        except Exception as e:
+            self._count("query_errors")
+            broken = self.backend.is_connection_error(e)
+            raise
+        finally:
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except Exception:
+                    broken = True
+            self.release(conn, broken=broken)
+
+    def _run(self, query: str, params: tuple, fetch: str):
+        table = _TABLE_RE.search(query)
+        for attempt in (1, 2):
+            try:
+                with span("db.query", table=table.group(1) if table else "other") as query_span, \
+                        self.cursor() as cursor:
+                    self._count("queries")
+                    cursor.execute(query, params)
+                    rows = cursor.fetchone() if fetch == "one" else cursor.fetchall()
+                    query_span.set(rows=(1 if rows else 0) if fetch == "one" else len(rows))
+                    return rows
+            except Exception as e:
+                if attempt == 2 or not self.backend.is_connection_error(e):
+                    raise
+                logger.warning(f"DB connection error, retrying on a fresh connection: {e}")
+                self._count("reconnects")
+
+    def fetch_one(self, query: str, params: tuple = ()):
+        return self._run(query, params, "one")
+
+    def fetch_all(self, query: str, params: tuple = ()):
+        return self._run(query, params, "all")
+
+    def metrics(self) -> dict:
+        with self._lock:
+            snapshot = dict(self._metrics)
+        snapshot["size"] = self.size
+        snapshot["idle"] = self._idle.qsize()
+        snapshot["backend"] = self.backend.name
+        return snapshot
+
+    def close_all(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._close(conn)
+
+
+def build_pool() -> ConnectionPool:
+    if DB_BACKEND == "sqlite":
+        backend = SQLiteBackend(SQLITE_DB_PATH)
+    else:
+        backend = MySQLBackend(DB_CONFIG)
+    return ConnectionPool(backend)
+
+
+pool = build_pool()
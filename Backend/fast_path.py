@@ -0,0 +1,190 @@
+"""
+Deterministic router for mechanical turns (benefit keyword, Aadhaar, OTP, email).
+It follows the Stage 1 / Stage 2 flow from prompt.txt per session, calls the matching tool
+directly and answers from a template; anything free-form still goes to the LLM. The PAN turn
+always goes to the LLM: VerifyIdentity needs the applicant's name, which only ever arrives as
+free text and cannot be picked out of the history reliably.
+"""
+import os
+import re
+import logging
+from lazy_imports import lazy_module
+types = lazy_module("google.genai.types")
+from tool_output import page_bounds, decode_cards
+logger = logging.getLogger("Fast-Path")
+
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "1") == "1"
+
+BENEFITS = ("Travel", "Fuel", "Groceries", "Shopping", "Dining", "Lifestyle", "Rewards", "Entertainment", "Student")
+_BENEFIT_LOOKUP = {b.lower(): b for b in BENEFITS}
+
+AADHAAR_RE = re.compile(r'^\d{12}$')
+OTP_RE = re.compile(r'^\d{6}$')
+EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+# The assistant asking for the Aadhaar number (step 8 of prompt.txt, or the retry after a failed OTP)
+ASKS_AADHAAR_RE = re.compile(r"\b(share|enter|provide|give|have|what is|what's)\b[^.?!]*\baadhaar (card )?(number|no\b)", re.I)
+
+
+def match_benefit(text: str):
+    """'travel', 'Travel cards', 'fuel card.' -> canonical benefit name, else None."""
+    words = re.sub(r"[^a-z ]", " ", text.lower()).split()
+    if words and words[-1] in ("card", "cards"):
+        words = words[:-1]
+    if len(words) == 1:
+        return _BENEFIT_LOOKUP.get(words[0])
+    return None
+
+
+def expected_input(reply: str):
+    """What the assistant's reply asked the user for, where the router depends on it; else None."""
+    if ASKS_AADHAAR_RE.search(reply or ""):
+        return "aadhaar"
+    return None
+
+
+def apply_tool_result(flow: dict, name: str, args: dict, result) -> None:
+    """Advances the per-session flow state from a tool outcome, whoever (router or LLM) made the call."""
+    result = str(result)
+    if name == "GetCreditCards":
+        offset, size = page_bounds(args.get("page"), args.get("page_size"), args.get("cursor"))
+        flow["benefit"] = args.get("keyword_name")
+        flow["page"] = offset // size + 1
+    elif name == "VerifyAadhaarSendOtp":
+        flow["aadhaar"] = args.get("aadhaar")
+        flow["aadhaar_otp_pending"] = result.startswith("OTP sent")
+        flow["aadhaar_verified"] = False
+    elif name == "VerifyAadhaarOtp":
+        verified = "verified successfully" in result
+        flow["aadhaar_otp_pending"] = not verified
+        flow["aadhaar_verified"] = verified
+        if verified:
+            flow["aadhaar"] = args.get("aadhaar")
+    elif name == "SendEmailOTP":
+        flow["email"] = args.get("email")
+        flow["email_otp_pending"] = result.startswith("OTP sent")
+        flow["email_verified"] = False
+    elif name == "VerifyEmailOTP":
+        verified = "successfully verified" in result
+        flow["email_otp_pending"] = not verified
+        flow["email_verified"] = verified
+    elif name == "VerifyIdentity":
+        flow["identity_verified"] = result.startswith("Identity verified")
+        if flow["identity_verified"]:
+            flow["name"] = args.get("name")
+            flow["pan"] = args.get("pan")
+
+
+def observe_messages(flow: dict, messages: list[dict]) -> None:
+    """Replays the function calls/responses and the final reply of an LLM-handled turn into the flow state."""
+    pending = {}
+    for message in messages:
+        for part in message.get("parts", []):
+            if "function_call" in part:
+                call = part["function_call"]
+                pending.setdefault(call.get("name"), []).append(call.get("args") or {})
+            elif "function_response" in part:
+                response = part["function_response"]
+                calls = pending.get(response.get("name")) or [{}]
+                args = calls.pop(0)
+                outcome = response.get("response", {})
+                apply_tool_result(flow, response.get("name"), args, outcome.get("result", outcome.get("error", "")))
+            elif message.get("role") == "model" and part.get("text"):
+                flow["expects"] = expected_input(part["text"])
+
+
+def _field(card: dict, key: str):
+    return card.get(key) or "N/A"
+
+
+def render_cards(benefit: str, cards: list[dict]) -> str:
+    """`cards` are the rows of a GetCreditCards result page (tool_output.decode_cards), in rank order."""
+    lines = [f"Here are the top {len(cards)} {benefit} credit cards for you:", ""]
+    for card in cards:
+        lines += [
+            f"{_field(card, 'rank')}. {_field(card, 'card_name')}",
+            f"Network: {_field(card, 'network')}",
+            f"Joining Fee: {_field(card, 'joining_fee')}",
+            f"Annual Fee: {_field(card, 'annual_fee')}",
+            f"Reward Type: {_field(card, 'reward_type')}",
+            f"Fee Waiver: {_field(card, 'fee_waiver')}",
+            f"Other Benefits: {_field(card, 'other_benefits')}",
+            "--------------------------------------------",
+        ]
+    lines.append("Would you like to apply for one of these cards, see more options, or choose a different benefit type?")
+    return "\n".join(lines)
+
+
+class FastPathRouter:
+    """
+    `call_tool(name, args)` is an async callable that runs a registered tool and returns its result.
+    route() returns None when the input needs the LLM.
+    """
+
+    def __init__(self, call_tool, enabled: bool = FAST_PATH_ENABLED):
+        self.call_tool = call_tool
+        self.enabled = enabled
+        self.stats = {"routed": 0, "llm": 0}
+
+    def plan(self, user_input: str, flow: dict):
+        """(tool name, args) for a mechanical input in the current flow state, else None."""
+        text = (user_input or "").strip()
+        compact = re.sub(r"[\s-]", "", text)
+
+        # Only once the conversation has reached the Aadhaar step (card chosen, name given), not for any 12 digits
+        if AADHAAR_RE.match(compact) and not flow.get("aadhaar_verified") and flow.get("expects") == "aadhaar":
+            return "VerifyAadhaarSendOtp", {"aadhaar": compact}
+        if OTP_RE.match(compact):
+            if flow.get("aadhaar_otp_pending") and flow.get("aadhaar"):
+                return "VerifyAadhaarOtp", {"aadhaar": flow["aadhaar"], "otp": compact}
+            if flow.get("email_otp_pending") and flow.get("email"):
+                return "VerifyEmailOTP", {"email": flow["email"], "otp": compact}
+            return None
+        if EMAIL_RE.match(text) and flow.get("aadhaar_verified") and not flow.get("email_verified"):
+            return "SendEmailOTP", {"email": text}
+        benefit = match_benefit(text)
+        if benefit and not flow.get("aadhaar"):
+            return "GetCreditCards", {"keyword_name": benefit}
+        return None
+
+    def reply(self, name: str, args: dict, result, flow: dict) -> str:
+        result = str(result)
+        if name == "GetCreditCards":
+            # Render the page the tool just returned, so the reply matches flow["page"] and the next "show more"
+            cards = decode_cards(result)
+            if not cards:
+                return result
+            return render_cards(args["keyword_name"], cards)
+        if name == "VerifyAadhaarOtp":
+            if flow.get("aadhaar_verified"):
+                return f"{result} Please share your email address."
+            return f"{result} Please enter your Aadhaar number again."
+        if name == "SendEmailOTP" and flow.get("email_otp_pending"):
+            return f"An OTP has been sent to {args['email']}. Please enter the 6-digit OTP to verify your email."
+        if name == "VerifyEmailOTP":
+            if flow.get("email_verified"):
+                return f"{result} Please share your Permanent Account Number (PAN) so I can verify your identity."
+            return f"{result} Please enter your email address again."
+        return result
+
+    async def route(self, user_input: str, flow: dict):
+        """Handles the turn without the LLM when possible; returns (tool name, reply, messages) or None."""
+        step = self.plan(user_input, flow) if self.enabled else None
+        if step is None:
+            self.stats["llm"] += 1
+            return None
+
+        name, args = step
+        result = await self.call_tool(name, args)
+        apply_tool_result(flow, name, args, result)
+        reply = self.reply(name, args, result, flow)
+        flow["expects"] = expected_input(reply)
+        self.stats["routed"] += 1
+        logger.info(f"Fast path handled {name} (routed={self.stats['routed']}, llm={self.stats['llm']})")
+
+        messages = [
+            types.Content(role="user", parts=[types.Part(text=user_input)]),
+            types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(name=name, args=args))]),
+            types.Content(role="user", parts=[types.Part.from_function_response(name=name, response={"result": result})]),
+            types.Content(role="model", parts=[types.Part(text=reply)]),
+        ]
+        return name, reply, [m.model_dump(mode="json", exclude_none=True) for m in messages]
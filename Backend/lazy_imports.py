@@ -0,0 +1,42 @@
+"""
+Deferred imports for the heavy dependencies (google.genai types, numpy). `lazy_module(name)` returns a
+stand-in that imports the real module the first time one of its attributes is used, so importing the
+app stays cheap; `warm_up()` loads them all off the request path once the server is up.
+"""
+import importlib
+import os
+import sys
+import time
+import types
+import logging
+logger = logging.getLogger("Lazy-Imports")
+
+LAZY_IMPORTS_ENABLED = os.getenv("LAZY_IMPORTS", "1") == "1"
+
+_registered = {}  # module name -> LazyModule
+
+
+class LazyModule(types.ModuleType):
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__name__)
+        # Copy the real namespace in so later lookups never come back through __getattr__
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def lazy_module(name: str):
+    """The module itself if it is already imported (or lazy imports are off), else a deferred stand-in."""
+    if not LAZY_IMPORTS_ENABLED or name in sys.modules:
+        return importlib.import_module(name)
+    module = _registered.get(name)
+    if module is None:
+        module = _registered[name] = LazyModule(name)
+    return module
+
+
+def warm_up():
+    """Imports every deferred module now, e.g. from a background thread right after startup."""
+    started = time.perf_counter()
+    for name in list(_registered):
+        importlib.import_module(name)
+    logger.info(f"Loaded deferred modules {sorted(_registered)} in {time.perf_counter() - started:.2f}s")
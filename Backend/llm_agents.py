@@ -1,484 +1,589 @@
-from google import genai
-from google.genai import types
-from langchain.memory import ConversationBufferMemory
-from langchain.tools import Tool
-from pydantic import BaseModel
-import os
-import json
-from google.genai.types import Content, Part
-from dotenv import load_dotenv
-load_dotenv()
-import re
-import logging
-from otp_simulator import (
-    generate_email_otp,
-    verify_email_otp,
-    generate_aadhaar_otp,
-    verify_aadhaar_otp,
-    send_email_confirmation 
-)
-from db_operations import (
-    search_credit_cards,
-    get_mobile_by_aadhaar,
-    verify_identity_records,
-    get_cibil_score_by_pan,
-    get_address_from_aadhaar,
-    get_salary_from_pan,
-    get_valid_cards
-)
-
-
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-logger = logging.getLogger("LoanAgent")
-
-with open(r"", "r") as f: #<--add prompt.txt directory here
-    SYSTEM_PROMPT = f.read()
-
-MODEL_NAME = os.getenv("LLM_MODEL", "gemini-2.5-flash")
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-
-client = genai.Client(api_key=GOOGLE_API_KEY)
-
-memory = ConversationBufferMemory(
-    memory_key="chat_history",
-    return_messages=True,  
-)
-
-class Creditcardtype(BaseModel):
-    keyword_name: str
-
-import json
-
-def search_credit_card_tool(keyword_name: str) -> str:
-    results = search_credit_cards(keyword_name)
-
-    if not results:
-        return f"No credit cards found matching: {keyword_name}. Please try another benefit type."
-
-    simplified = []
-    for card in results:
-        simplified.append({
-            "Card Name": card.get("card_name", "N/A"),
-            "Network": card.get("payment_network", "N/A"),
-            "Joining Fee": card.get("joining_fee", "N/A"),
-            "Annual Fee": card.get("annual_fee", "N/A"),
-            "Reward Type": card.get("reward_method", "N/A"),
-            "Fee Waiver": card.get("fee_waiver", "N/A"),
-            "Other Benefits": card.get("other_benefits", "N/A"),
-            "Preferred Bank": card.get("PreferredBank", "No"),
-            "Min CIBIL": card.get("MinCIBIL", "N/A"),
-            "Min Annual Income": card.get("MinAnnualIncome", "N/A")
-        })
-    json_summary = json.dumps(simplified, ensure_ascii=False, separators=(',', ':'))
-    return (
-        f"Fetched {len(results)} credit cards for '{keyword_name}' benefits. "
-        "Use this dataset to display the top 5 cards, preferring those from HDFC, Axis, ICICI, SBI, "
-        "Standard Chartered, or American Express. If user asks for more, you can display additional ones.\n\n"
-        f"Credit Card Dataset:\n{json_summary}"
-    )
-
-#-----------------------------------------------------------------------------------------------------------------------------
-def send_email_otp(email: str) -> str:
-    if not re.match(r"[^@]+@[^@]+\.[^@]+", email or ""):
-        return "Invalid email"
-    result = generate_email_otp(email)
-    logger.info(f"Sent OTP for email {email}: {result}")
-    return f"OTP sent to email successfully: {email}"
-
-def verify_email_otp_tool(email: str, otp: str) -> str:
-    """Verifies an email OTP with full validation and error handling."""
-    try:
-        if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
-            return "Invalid email format."  
-        if not re.match(r"^\d{6}$", otp):
-            return "Invalid OTP format. OTP should be 6 digits."
-        result = verify_email_otp(email, otp)
-        if isinstance(result, dict) and result.get("success"):
-            logger.info(f"Email OTP verification for {email}: Success")
-            return "Thank you. Your email has been successfully verified."
-        else:
-            logger.info(f"Email OTP verification for {email}: Failed ({result.get('error', 'Unknown error')})")
-            return f"Invalid or expired OTP. Please try again."
-
-    except Exception as e:
-        logger.exception(f"Error in verify_email_otp_tool: {e}")
-        return "An unexpected error occurred while verifying your email OTP."
-
-
-    
-def verify_aadhaar_send_otp(aadhaar: str) -> str:
-    """Sends an OTP to the Aadhaar-linked mobile number."""
-    try:
-        if not aadhaar:
-            logger.error("Aadhaar argument missing or None in tool call.")
-            return "Aadhaar number missing. Please enter a valid 12-digit Aadhaar."
-
-        aadhaar = str(aadhaar).strip()
-        if not re.match(r'^\d{12}$', aadhaar):
-            return "Invalid Aadhaar number format. Please enter a valid 12-digit Aadhaar."
-
-        mobile = get_mobile_by_aadhaar(aadhaar)
-        logger.debug(f"Aadhaar lookup result: {mobile}")
-
-        if not mobile:
-            logger.error(f"No mobile linked to Aadhaar {aadhaar}")
-            return "No mobile linked to this Aadhaar number."
-
-        otp_status = generate_aadhaar_otp(aadhaar)
-        logger.info(f"Sent Aadhaar OTP for {aadhaar} to mobile {mobile}: {otp_status}")
-
-        if not otp_status or not otp_status.get("success"):
-            return f"Failed to send OTP: {otp_status.get('error', 'Unknown error')}"
-
-        masked = f"{mobile[:2]}*****{mobile[-3:]}"
-        return f"OTP sent to your Aadhaar-linked mobile number ending with {masked}. Please enter the OTP to continue."
-
-    except Exception as e:
-        logger.exception(f"Unexpected error in verify_aadhaar_send_otp: {e}")
-        return "An unexpected error occurred while sending the OTP. Please try again later."
-
-
-def verify_aadhaar_otp_tool(aadhaar: str, otp: str) -> str:
-    """Verifies an Aadhaar OTP using the Aadhaar number and OTP entered by the user."""
-    try:
-        if not aadhaar or not re.match(r'^\d{12}$', aadhaar.strip()):
-            return "Invalid Aadhaar number format. Please enter a valid 12-digit Aadhaar."
-
-        if not otp or not re.match(r'^\d{6}$', otp.strip()):
-            return "Invalid OTP format. Please enter a valid 6-digit OTP."
-
-        result = verify_aadhaar_otp(aadhaar.strip(), otp.strip())
-
-        logger.info(f"Aadhaar OTP verification for {aadhaar}: {'Success' if result.get('success') else 'Failed'}")
-
-        if result.get("success"):
-            return "✅ Aadhaar verified successfully!"
-        else:
-            return f"❌ Verification failed: {result.get('error', 'Unknown error')}"
-
-    except Exception as e:
-        logger.exception(f"Error verifying Aadhaar OTP: {e}")
-        return "An unexpected error occurred while verifying the Aadhaar OTP."
-
-
-def verify_identity_tool(name: str, aadhaar: str, pan: str) -> str:
-    """Verifies identity details (Name, Aadhaar, PAN) with safe parsing and validation."""
-    try:
-        # Basic validation checks
-        if not re.match(r'^[a-zA-Z ]{2,50}$', name):
-            return "Invalid name format. Only alphabets and spaces allowed."
-        if not re.match(r'^\d{12}$', aadhaar):
-            return "Invalid Aadhaar format. Must be a 12-digit number."
-        if not re.match(r'^[A-Z]{5}[0-9]{4}[A-Z]{1}$', pan):
-            return "Invalid PAN format. Example: ABCDE1234F"
-
-        # Perform the actual verification
-        is_valid = verify_identity_records(name, aadhaar, pan)
-        logger.info(f"Identity verification for {name}, {aadhaar}, {pan}: {'Success' if is_valid else 'Failed'}")
-
-        return "Identity verified!" if is_valid else "Identity verification failed."
-    except Exception as e:
-        logger.exception(f"Error in verify_identity_tool: {e}")
-        return "An unexpected error occurred during identity verification. Please try again."
-
-
-
-def get_cibil_tool(pan: str) -> str:
-    if not re.match(r'^[A-Z]{5}[0-9]{4}[A-Z]{1}$', pan):
-        return "Invalid PAN format"
-    score = get_cibil_score_by_pan(pan.strip())
-    logger.info(f"CIBIL score for PAN {pan}: {score}")
-    if score == -1:
-        return "CIBIL score not found for given PAN."
-    return f"The User's CIBIL score is {score}."
-
-def get_salary_tool(pan: str) -> str:
-    if not re.match(r'^[A-Z]{5}[0-9]{4}[A-Z]{1}$', pan):
-        return "Invalid PAN format"
-    salary = get_salary_from_pan(pan.strip())
-    logger.info(f"Salary for PAN {pan}: {salary}")
-    if salary == -1:
-        return "Salary not found for given PAN."
-    return f"The User's salary is ₹{salary}."
-
-def get_vaild_cards_tool(salary: float, cibil: int, major_keyword: str) -> str:
-    """Fetches and formats valid credit card options based on salary, CIBIL score, and benefit type."""
-    try:
-        salary = float(salary)
-    except (ValueError, TypeError):
-        salary = 0.0
-
-    results = get_valid_cards(salary, cibil, major_keyword)
-
-    if not results:
-        return f"No credit cards found matching: {major_keyword}. Please try another benefit type."
-
-    ranked = sorted(
-        results,
-        key=lambda card: (
-            card.get("annual_fee", 999999) or 999999,
-            card.get("joining_fee", 999999) or 999999
-        )
-    )
-
-    simplified = []
-    for card in ranked:
-        simplified.append({
-            "Card Name": card.get("card_name", "N/A"),
-            "Network": card.get("payment_network", "N/A"),
-            "Joining Fee": card.get("joining_fee", "N/A"),
-            "Annual Fee": card.get("annual_fee", "N/A"),
-            "Reward Type": card.get("reward_method", "N/A"),
-            "Fee Waiver": card.get("fee_waiver", "N/A"),
-            "Other Benefits": card.get("other_benefits", "N/A"),
-            "Preferred Bank": card.get("PreferredBank", "No"),
-            "Min CIBIL": card.get("MinCIBIL", "N/A"),
-            "Min Annual Income": card.get("MinAnnualIncome", "N/A")
-        })
-
-    json_summary = json.dumps(simplified, ensure_ascii=False, separators=(',', ':'))
-    return (
-        f"Fetched {len(results)} valid credit cards for '{major_keyword}' benefits "
-        f"(CIBIL: {cibil}, Salary: ₹{salary:,.0f}). "
-        "Use this dataset to display the most suitable cards, prioritizing those from HDFC, Axis, ICICI, SBI, "
-        "Standard Chartered, or American Express. If user asks for more, show additional ones.\n\n"
-        f"Valid Credit Card Dataset:\n{json_summary}"
-    )
-
-
-#-----------------------------------------------------------------------------------------------------------------------------
-def get_address_tool(aadhaar: str) -> str:
-    result= get_address_from_aadhaar(aadhaar)
-    if not result:
-        return f"No credit cards found matching: {aadhaar}. Please try another benefit type."
-    else:
-        return result
-
-def send_confirmation_tool(email: str) -> str:
-    """Sends a confirmation email to the given address."""
-    try:
-        email = email.strip()
-        send_email_confirmation(email)
-        logger.info(f"Confirmation email sent to {email}")
-        return f"Confirmation email sent to: {email}"
-    except Exception as e:
-        logger.error(f"Error sending confirmation email: {e}")
-        return "Failed to send confirmation email. Please check the email address."
-
-tools = [
-    Tool.from_function(
-        name= "GetCreditCards",
-        func= search_credit_card_tool,
-        description= "Get Credit cards based on benefit type"
-    ),
-    Tool.from_function(
-        name="SendEmailOTP",
-        func=send_email_otp,
-        description="Send OTP to email. Input: email as string."
-    ),
-    Tool.from_function(
-        name="VerifyEmailOTP",
-        func=verify_email_otp_tool,
-        description="Verify email OTP. Takes two parameters: email and otp."
-    ),
-    Tool.from_function(
-        name="VerifyAadhaarSendOtp",
-        func=verify_aadhaar_send_otp,
-        description="Sends an OTP to the mobile linked with the given Aadhaar number.",
-        args_schema={"aadhaar":str},
-    ),
-    Tool.from_function(
-        name="VerifyAadhaarOtp",
-        func=verify_aadhaar_otp_tool,
-        description="Verify Aadhaar OTP using Aadhaar number and OTP. Inputs: aadhaar (12-digit), otp (6-digit)"
-    ),
-    Tool.from_function(
-        name="VerifyIdentity",
-        func=verify_identity_tool,
-        description="Verify user identity details using name, Aadhaar, and PAN. Takes three parameters: name, aadhaar, pan."
-    ),
-    Tool.from_function(
-        name="GetCibil",
-        func=get_cibil_tool,
-        description="Get the CIBIL of the user using their PAN"
-    ),
-    Tool.from_function(
-        name="GetAddress",
-        func=get_address_tool,
-        description="Get the address of the user using their Aadhaar"
-    ),
-    Tool.from_function(
-        name="GetSalary",
-        func=get_salary_tool,
-        description="Get the salary of the user using their PAN"
-    ),
-    Tool.from_function(
-        name="GetValidCards",
-        func=get_vaild_cards_tool,
-        description="Get credit cards matching user CIBIL and salary"
-    ),
-    Tool.from_function(
-        name="SendConfirmation",
-        func=send_confirmation_tool,
-        description="Send Confirmation of user application"
-    )
-]
-
-tools_registry  = {
-            "GetCreditCards": search_credit_card_tool,
-            "SendEmailOTP": send_email_otp,
-            "VerifyEmailOTP": verify_email_otp_tool,
-            "VerifyAadhaarSendOtp": verify_aadhaar_send_otp,
-            "VerifyAadhaarOtp": verify_aadhaar_otp_tool,
-            "VerifyIdentity": verify_identity_tool,
-            "GetCibil": get_cibil_tool,
-            "GetAddress": get_address_tool,
-            "GetSalary": get_salary_tool,
-            "GetValidCards": get_vaild_cards_tool,
-            "SendConfirmation": send_confirmation_tool
-        }
-
-def run_gemini(prompt: str, tools_registry=None):
-    try:
-        logger.info("--- Running Gemini ---")
-
-        contents = [
-            types.Content(
-                role="user",
-                parts=[types.Part(text=prompt)]
-            )
-        ]
-
-        tool_defs = []
-        for name, fn in (tools_registry or {}).items():
-            if not name or not re.match(r'^[A-Za-z_][A-Za-z0-9_\.\-:]{0,63}$', name):
-                logger.warning(f"Skipping invalid function name: {name}")
-                continue
-
-            params = {
-                "type": "object",
-                "properties": {},
-                "required": []
-            }
-
-            try:
-                import inspect
-                sig = inspect.signature(fn)
-                for param_name, param in sig.parameters.items():
-                    params["properties"][param_name] = {"type": "string"}
-                    params["required"].append(param_name)
-            except Exception:
-                pass
-
-            tool_defs.append(
-                types.Tool(
-                    function_declarations=[
-                        types.FunctionDeclaration(
-                            name=name,
-                            description=fn.__doc__ or f"Function {name} for Gemini tool calling.",
-                            parameters=params
-                        )
-                    ]
-                )
-            )
-
-        response = client.models.generate_content(
-            model=MODEL_NAME,
-            contents=contents,
-            config=types.GenerateContentConfig(
-                tools=tool_defs,
-                automatic_function_calling=types.AutomaticFunctionCallingConfig(disable=False),
-            )
-        )
-
-        logger.info(f"Gemini raw response: {repr(response)}")
-
-        if response and hasattr(response, "candidates"):
-            for candidate in response.candidates:
-                parts = getattr(candidate.content, "parts", [])
-                for part in parts:
-                    if hasattr(part, "function_call") and part.function_call:
-                        fn_call = part.function_call
-                        fn_name = fn_call.name
-                        fn_args = json.loads(fn_call.args) if isinstance(fn_call.args, str) else fn_call.args
-                        logger.info(f"Tool Call: {fn_name}({fn_args})")
-
-                        if fn_name in (tools_registry or {}):
-                            fn = tools_registry[fn_name]
-                            if not fn_args or any(v is None for v in fn_args.values()):
-                                logger.warning(f"Skipping tool call {fn_name} due to missing args: {fn_args}")
-                                return f"Tool call skipped: invalid arguments ({fn_args})"
-                            try:
-                                # ✅ Run the tool only once
-                                result = fn(**fn_args)
-                                logger.info(f"Tool result for {fn_name}: {result}")
-
-                                # ✅ Prevent Gemini from re-calling the same tool
-                                safe_result_text = (
-                                    f"The tool {fn_name} executed successfully and returned this result:\n"
-                                    f"{result}\n"
-                                    f"Please continue the conversation naturally based on this result. "
-                                    f"Do not call the same tool again."
-                                )
-
-                                # ✅ Feed result back for natural continuation
-                                follow_up = client.models.generate_content(
-                                    model=MODEL_NAME,
-                                    contents=[
-                                        types.Content(role="user", parts=[types.Part(text=prompt)]),
-                                        types.Content(role="model", parts=[types.Part(text=safe_result_text)])
-                                    ]
-                                )
-
-                                return follow_up.text.strip() if hasattr(follow_up, "text") and follow_up.text else str(result)
-
-                            except Exception as e:
-                                logger.error(f"Error executing tool {fn_name}: {e}")
-                                return f"Tool execution failed for {fn_name}: {e}"
-
-        if hasattr(response, "text") and response.text:
-            return response.text.strip()
-
-        return "No valid response received from Gemini."
-
-    except Exception as e:
-        logger.error(f"Gemini tool execution failed: {e}", exc_info=True)
-        return f"Gemini tool execution failed: {str(e)}"
-
-
-def run_llm_agents(user_input: str) -> str:
-    try:
-        memory_vars = memory.load_memory_variables({})
-        chat_history = memory_vars.get("chat_history", [])
-
-        history_text = "\n".join(
-            [f"User: {msg.content}" if msg.type == "human" else f"AI: {msg.content}" for msg in chat_history]
-        )
-
-        prompt = f"""{SYSTEM_PROMPT}
-
-Previous conversation:
-{history_text}
-
-User query: {user_input}
-"""
-        output = run_gemini(prompt, tools_registry)
-        memory.save_context({"input": user_input}, {"output": output[:4000]})
-        return output.strip()
-
-    except Exception as e:
-        logger.error(f"Agent execution failed: {e}")
-        return f"Agent execution failed: {str(e)}"
-    
-
-def test_run_gemini():
-    print("\n--- Running Gemini Test ---")
-    test_prompt = "List the top 3 benefits of using a travel credit card."
-    
-    result = run_gemini(test_prompt, tools_registry)
-    print("\nGemini Test Output:\n", result)
-    print("--- Test Complete ---\n")
-
-if __name__ == "__main__":
-
-    test_run_gemini()
+import os
+import json
+from dotenv import load_dotenv
+load_dotenv()
+import re
+import logging
+import asyncio
+import time
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from lazy_imports import lazy_module
+types = lazy_module("google.genai.types")
+from otp_simulator import (
+    generate_email_otp,
+    verify_email_otp,
+    generate_aadhaar_otp,
+    verify_aadhaar_otp,
+    send_email_confirmation 
+)
+from session_store import session_store, current_session_id
+from ttl_cache import TTLCache, MISSING
+from tool_registry import ToolRegistry
+from conversation import ConversationBuilder
+from fast_path import FastPathRouter, observe_messages
+from answer_cache import AnswerCache, advance_flow
+from card_ranking import RANKING_TOP_K, profile_dependent
+import tool_output
+from tool_output import TOOL_PAGE_SIZE, page_bounds
+from prompt_cache import SystemPromptCache, is_cache_miss_error, token_stats
+from tracing import span, trace, annotate
+from admission import gemini_limiter, session_limiter, Overloaded, is_rate_limit_error
+from db_operations import (
+    rank_credit_cards,
+    get_mobile_by_aadhaar,
+    verify_identity_records,
+    get_cibil_score_by_pan,
+    get_address_from_aadhaar,
+    get_salary_from_pan,
+    prefetch_profile,
+    card_catalog
+)
+
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logger = logging.getLogger("LoanAgent")
+
+PROMPT_PATH = os.getenv("PROMPT_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompt.txt"))
+MODEL_NAME = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+
+
+@functools.lru_cache(maxsize=None)
+def get_system_prompt() -> str:
+    with open(PROMPT_PATH, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+@functools.lru_cache(maxsize=None)
+def get_client():
+    """The Gemini client (or the offline stub), built on first use rather than at import."""
+    if os.getenv("LLM_STUB") == "1":
+        from stub_genai import StubClient
+        return StubClient()
+    from google import genai
+    return genai.Client(api_key=GOOGLE_API_KEY)
+
+
+@functools.lru_cache(maxsize=None)
+def get_prompt_cache() -> SystemPromptCache:
+    return SystemPromptCache(get_client(), MODEL_NAME, get_system_prompt())
+
+
+def __getattr__(name):
+    # `llm_agents.client` / `.prompt_cache` / `.SYSTEM_PROMPT` keep working for callers, built lazily
+    if name == "client":
+        return get_client()
+    if name == "prompt_cache":
+        return get_prompt_cache()
+    if name == "SYSTEM_PROMPT":
+        return get_system_prompt()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Encoded card pages (see _card_page) keyed on (tool, catalog version, keyword, page[, eligibility bucket]).
+# The version in the key is the only invalidation: pages of an older catalog can't be hit and age out of the LRU.
+# The per-call heading (which for GetValidCards names the exact CIBIL and salary) is added around the cached table.
+card_response_cache = TTLCache(int(os.getenv("CARD_RESPONSE_CACHE_SIZE", "512")))
+
+def _card_page(rank, offset: int, size: int):
+    """(total, shown, rows cut by the token budget, csv table, old JSON tokens) for one page; None when nothing matches."""
+    results, total = rank(max(RANKING_TOP_K, offset + size))
+    if not total:
+        return None
+    page = results[offset:offset + size]
+    if not page:
+        return (total, 0, 0, "", 0)
+    table, shown = tool_output.encode_cards(page, offset + 1)
+    # Baseline: the top RANKING_TOP_K cards as verbose JSON, which is what every call used to send
+    return (total, shown, len(page) - shown, table, tool_output.legacy_tokens(results[:RANKING_TOP_K]))
+
+
+def _card_result(tool: str, cached: tuple, offset: int, heading: str, more: str) -> str:
+    total, shown, trimmed, table, json_tokens = cached
+    if not shown:
+        return f"No more cards: all {total} {heading} have already been shown."
+    end = offset + shown
+    next_step = (f"If the user asks for more, {more} cursor={end}." if end < total
+                 else "These are the last matching cards.")
+    text = (
+        f"Cards {offset + 1}-{end} of {total} {heading}, already ranked best first "
+        "(preferred banks, then lower fees). Present them in this order with their rank numbers. "
+        f"{next_step}\n\n"
+        f"{tool_output.TABLE_HEADING}\n{table}"
+    )
+    tool_output.record(tool, tool_output.estimate_tokens(text), json_tokens, trimmed)
+    return text
+
+
+def search_credit_card_tool(keyword_name: str, page: int = 1, page_size: int = TOOL_PAGE_SIZE, cursor: int = 0) -> str:
+    """Get the credit cards for a benefit type, ranked best first, one page at a time. To show more, call again with the cursor from the previous result."""
+    offset, size = page_bounds(page, page_size, cursor)
+    key = ("search", card_catalog.current_version(), (keyword_name or "").strip().lower(), offset, size)
+    cached = card_response_cache.get(key)
+    if cached is MISSING:
+        cached = _card_page(lambda k: rank_credit_cards(keyword_name, k), offset, size)
+        card_response_cache.set(key, cached)
+
+    if not cached:
+        return f"No credit cards found matching: {keyword_name}. Please try another benefit type."
+    return _card_result("GetCreditCards", cached, offset, f"credit cards for '{keyword_name}' benefits",
+                        "call GetCreditCards again with the same keyword_name and")
+
+#-----------------------------------------------------------------------------------------------------------------------------
+def send_email_otp(email: str) -> str:
+    if not re.match(r"[^@]+@[^@]+\.[^@]+", email or "") or not email.isascii():
+        return "Invalid email"
+    result = generate_email_otp(email)
+    if not result.get("success"):
+        logger.error(f"Could not queue OTP email for {email}: {result.get('error')}")
+        return "Failed to send OTP to this email right now. Please try again in a moment."
+    logger.info(f"Queued OTP email for {email}")
+    return f"OTP sent to email successfully: {email}"
+
+def verify_email_otp_tool(email: str, otp: str) -> str:
+    """Verifies an email OTP with full validation and error handling."""
+    try:
+        if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
+            return "Invalid email format."  
+        if not re.match(r"^\d{6}$", otp):
+            return "Invalid OTP format. OTP should be 6 digits."
+        result = verify_email_otp(email, otp)
+        if isinstance(result, dict) and result.get("success"):
+            logger.info(f"Email OTP verification for {email}: Success")
+            return "Thank you. Your email has been successfully verified."
+        else:
+            logger.info(f"Email OTP verification for {email}: Failed ({result.get('error', 'Unknown error')})")
+            return f"Invalid or expired OTP. Please try again."
+
+    except Exception as e:
+        logger.exception(f"Error in verify_email_otp_tool: {e}")
+        return "An unexpected error occurred while verifying your email OTP."
+
+
+    
+def verify_aadhaar_send_otp(aadhaar: str) -> str:
+    """Sends an OTP to the Aadhaar-linked mobile number."""
+    try:
+        if not aadhaar:
+            logger.error("Aadhaar argument missing or None in tool call.")
+            return "Aadhaar number missing. Please enter a valid 12-digit Aadhaar."
+
+        aadhaar = str(aadhaar).strip()
+        if not re.match(r'^\d{12}$', aadhaar):
+            return "Invalid Aadhaar number format. Please enter a valid 12-digit Aadhaar."
+
+        mobile = get_mobile_by_aadhaar(aadhaar)
+        logger.debug(f"Aadhaar lookup result: {mobile}")
+
+        if not mobile:
+            logger.error(f"No mobile linked to Aadhaar {aadhaar}")
+            return "No mobile linked to this Aadhaar number."
+
+        otp_status = generate_aadhaar_otp(aadhaar)
+        logger.info(f"Sent Aadhaar OTP for {aadhaar} to mobile {mobile}: {otp_status}")
+
+        if not otp_status or not otp_status.get("success"):
+            return f"Failed to send OTP: {otp_status.get('error', 'Unknown error')}"
+
+        masked = f"{mobile[:2]}*****{mobile[-3:]}"
+        return f"OTP sent to your Aadhaar-linked mobile number ending with {masked}. Please enter the OTP to continue."
+
+    except Exception as e:
+        logger.exception(f"Unexpected error in verify_aadhaar_send_otp: {e}")
+        return "An unexpected error occurred while sending the OTP. Please try again later."
+
+
+def verify_aadhaar_otp_tool(aadhaar: str, otp: str) -> str:
+    """Verifies an Aadhaar OTP using the Aadhaar number and OTP entered by the user."""
+    try:
+        if not aadhaar or not re.match(r'^\d{12}$', aadhaar.strip()):
+            return "Invalid Aadhaar number format. Please enter a valid 12-digit Aadhaar."
+
+        if not otp or not re.match(r'^\d{6}$', otp.strip()):
+            return "Invalid OTP format. Please enter a valid 6-digit OTP."
+
+        result = verify_aadhaar_otp(aadhaar.strip(), otp.strip())
+
+        logger.info(f"Aadhaar OTP verification for {aadhaar}: {'Success' if result.get('success') else 'Failed'}")
+
+        if result.get("success"):
+            return "✅ Aadhaar verified successfully!"
+        else:
+            return f"❌ Verification failed: {result.get('error', 'Unknown error')}"
+
+    except Exception as e:
+        logger.exception(f"Error verifying Aadhaar OTP: {e}")
+        return "An unexpected error occurred while verifying the Aadhaar OTP."
+
+
+def verify_identity_tool(name: str, aadhaar: str, pan: str) -> str:
+    """Verifies identity details (Name, Aadhaar, PAN) with safe parsing and validation."""
+    try:
+        # Basic validation checks
+        if not re.match(r'^[a-zA-Z ]{2,50}$', name):
+            return "Invalid name format. Only alphabets and spaces allowed."
+        if not re.match(r'^\d{12}$', aadhaar):
+            return "Invalid Aadhaar format. Must be a 12-digit number."
+        if not re.match(r'^[A-Z]{5}[0-9]{4}[A-Z]{1}$', pan):
+            return "Invalid PAN format. Example: ABCDE1234F"
+
+        # Perform the actual verification
+        is_valid = verify_identity_records(name, aadhaar, pan)
+        logger.info(f"Identity verification for {name}, {aadhaar}, {pan}: {'Success' if is_valid else 'Failed'}")
+
+        if is_valid:
+            # CIBIL, salary and address are the next steps; load them while the model writes its reply
+            prefetch_profile(aadhaar, pan)
+        return "Identity verified!" if is_valid else "Identity verification failed."
+    except Exception as e:
+        logger.exception(f"Error in verify_identity_tool: {e}")
+        return "An unexpected error occurred during identity verification. Please try again."
+
+
+
+def get_cibil_tool(pan: str) -> str:
+    if not re.match(r'^[A-Z]{5}[0-9]{4}[A-Z]{1}$', pan):
+        return "Invalid PAN format"
+    score = get_cibil_score_by_pan(pan.strip())
+    logger.info(f"CIBIL score for PAN {pan}: {score}")
+    if score == -1:
+        return "CIBIL score not found for given PAN."
+    return f"The User's CIBIL score is {score}."
+
+def get_salary_tool(pan: str) -> str:
+    if not re.match(r'^[A-Z]{5}[0-9]{4}[A-Z]{1}$', pan):
+        return "Invalid PAN format"
+    salary = get_salary_from_pan(pan.strip())
+    logger.info(f"Salary for PAN {pan}: {salary}")
+    if salary == -1:
+        return "Salary not found for given PAN."
+    return f"The User's salary is ₹{salary}."
+
+def get_vaild_cards_tool(salary: float, cibil: int, major_keyword: str, page: int = 1,
+                         page_size: int = TOOL_PAGE_SIZE, cursor: int = 0) -> str:
+    """Get the credit cards the user qualifies for (salary, CIBIL score, benefit type), ranked best first, one page at a time. To show more, call again with the cursor from the previous result."""
+    try:
+        salary = float(salary)
+    except (ValueError, TypeError):
+        salary = 0.0
+
+    offset, size = page_bounds(page, page_size, cursor)
+    version, cibil_cut, income_cut = card_catalog.eligibility_bucket(salary, int(cibil))
+    key = ("valid", version, (major_keyword or "").strip().lower(), offset, size, cibil_cut, income_cut)
+    if profile_dependent():
+        key += (int(cibil), salary)
+    cached = card_response_cache.get(key)
+    if cached is MISSING:
+        cached = _card_page(lambda k: rank_credit_cards(major_keyword, k, salary, cibil), offset, size)
+        card_response_cache.set(key, cached)
+
+    if not cached:
+        return f"No credit cards found matching: {major_keyword}. Please try another benefit type."
+    return _card_result("GetValidCards", cached, offset,
+                        f"valid credit cards for '{major_keyword}' benefits (CIBIL: {cibil}, Salary: ₹{salary:,.0f})",
+                        "call GetValidCards again with the same salary, cibil and major_keyword and")
+
+
+#-----------------------------------------------------------------------------------------------------------------------------
+def get_address_tool(aadhaar: str) -> str:
+    result= get_address_from_aadhaar(aadhaar)
+    if not result:
+        return f"No credit cards found matching: {aadhaar}. Please try another benefit type."
+    else:
+        return result
+
+def send_confirmation_tool(email: str) -> str:
+    """Sends a confirmation email to the given address."""
+    try:
+        email = email.strip()
+        send_email_confirmation(email)
+        logger.info(f"Confirmation email sent to {email}")
+        return f"Confirmation email sent to: {email}"
+    except Exception as e:
+        logger.error(f"Error sending confirmation email: {e}")
+        return "Failed to send confirmation email. Please check the email address."
+
+tools_registry = ToolRegistry()
+tools_registry.register("GetCreditCards", search_credit_card_tool)
+tools_registry.register("SendEmailOTP", send_email_otp, "Send OTP to email. Input: email as string.")
+tools_registry.register("VerifyEmailOTP", verify_email_otp_tool)
+tools_registry.register("VerifyAadhaarSendOtp", verify_aadhaar_send_otp)
+tools_registry.register("VerifyAadhaarOtp", verify_aadhaar_otp_tool)
+tools_registry.register("VerifyIdentity", verify_identity_tool)
+tools_registry.register("GetCibil", get_cibil_tool, "Get the CIBIL of the user using their PAN")
+tools_registry.register("GetAddress", get_address_tool, "Get the address of the user using their Aadhaar")
+tools_registry.register("GetSalary", get_salary_tool, "Get the salary of the user using their PAN")
+tools_registry.register("GetValidCards", get_vaild_cards_tool)
+tools_registry.register("SendConfirmation", send_confirmation_tool)
+
+MAX_TOOL_ITERATIONS = int(os.getenv("MAX_TOOL_ITERATIONS", "5"))
+tool_executor = ThreadPoolExecutor(max_workers=int(os.getenv("TOOL_WORKERS", "16")), thread_name_prefix="tool")
+
+
+async def dispatch_tool(fn, fn_args: dict):
+    """Runs a blocking tool (MySQL / SMTP) on the tool executor so the event loop stays free."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(tool_executor, functools.partial(ctx.run, fn, **fn_args))
+
+
+async def run_tool_call(fn_call, tools_registry) -> "types.Part":
+    """Executes one function call and wraps the outcome (or the problem) as a FunctionResponse part."""
+    fn_name = fn_call.name
+    fn_args = json.loads(fn_call.args) if isinstance(fn_call.args, str) else (fn_call.args or {})
+    logger.info(f"Tool call: {fn_name}")
+    logger.debug(f"Tool args for {fn_name}: {fn_args}")
+
+    if fn_name not in (tools_registry or {}):
+        logger.warning(f"Model called unknown tool {fn_name}")
+        response = {"error": f"Unknown tool {fn_name}."}
+    elif not fn_args or any(v is None for v in fn_args.values()):
+        logger.warning(f"Skipping tool call {fn_name} due to missing args: {fn_args}")
+        response = {"error": f"Tool call skipped: invalid arguments ({fn_args}). Ask the user for the missing details."}
+    else:
+        try:
+            result = await call_tool(fn_name, fn_args, tools_registry)
+            logger.debug(f"Tool result for {fn_name}: {len(str(result))} chars")
+            response = {"result": result}
+        except Exception as e:
+            logger.error(f"Error executing tool {fn_name}: {e}")
+            response = {"error": f"Tool execution failed for {fn_name}: {e}"}
+    return types.Part.from_function_response(name=fn_name, response=response)
+
+
+async def generate_stream(contents, tools_registry=None):
+    """
+    One streaming Gemini call with the system prompt and tools attached via the prompt cache
+    (or inline); yields response chunks as Gemini produces them.
+    """
+    tools = tools_registry.declarations if tools_registry else ()
+    client = get_client()
+    prompt_cache = get_prompt_cache()
+    cache_kwargs = await prompt_cache.config_kwargs(tools)
+
+    def config(kwargs):
+        return types.GenerateContentConfig(
+            **kwargs,
+            automatic_function_calling=types.AutomaticFunctionCallingConfig(disable=False),
+        )
+
+    with span("gemini.call") as call_span:
+        call_span.set(contents=len(contents), prompt_cached=int("cached_content" in cache_kwargs))
+        try:
+            stream = await client.aio.models.generate_content_stream(model=MODEL_NAME, contents=contents, config=config(cache_kwargs))
+        except Exception as e:
+            if "cached_content" not in cache_kwargs or not is_cache_miss_error(e):
+                raise
+            logger.warning(f"Prompt cache {cache_kwargs['cached_content']} is gone, retrying inline: {e}")
+            prompt_cache.invalidate()
+            call_span.set(prompt_cached=0)
+            stream = await client.aio.models.generate_content_stream(
+                model=MODEL_NAME, contents=contents, config=config(prompt_cache.inline(tools))
+            )
+        last = None
+        chunks = 0
+        async for chunk in stream:
+            if last is None:
+                call_span.set(first_chunk_ms=round(1000 * (time.perf_counter() - call_span.start), 3))
+            last = chunk
+            chunks += 1
+            yield chunk
+        call_span.set(chunks=chunks)
+        if last is not None:
+            usage = token_stats.record(last)
+            call_span.set(prompt_tokens=usage["prompt"], cached_tokens=usage["cached"], output_tokens=usage["output"])
+
+
+def _chunk_parts(chunk) -> list:
+    parts = []
+    for candidate in getattr(chunk, "candidates", None) or []:
+        if candidate.content and candidate.content.parts:
+            parts.extend(candidate.content.parts)
+    return parts
+
+
+async def _stream_text(contents, tools_registry, collected: list):
+    """Streams one Gemini call, yielding text deltas; function-call parts are collected for the caller."""
+    async for chunk in generate_stream(contents, tools_registry):
+        for part in _chunk_parts(chunk):
+            if part.function_call:
+                collected.append(part)
+            elif part.text and not part.thought:
+                yield part.text
+
+
+async def stream_gemini(conversation: ConversationBuilder, tools_registry=None):
+    """
+    Runs one agent turn and yields progress events:
+    {"type": "token", "text": ...} for streamed text, {"type": "tool", "name": ...} when a tool runs,
+    and a final {"type": "done", "text": ...} carrying the complete answer.
+
+    Function calls are answered with FunctionResponse parts and the model is called again, up to
+    MAX_TOOL_ITERATIONS times; independent calls emitted in one response run concurrently.
+    """
+    emitted = False
+    try:
+        logger.info("--- Running Gemini ---")
+
+        text = ""
+        last_result = None
+        for iteration in range(MAX_TOOL_ITERATIONS + 1):
+            fn_parts = []
+            text = ""
+            async for delta in _stream_text(conversation.contents(), tools_registry, fn_parts):
+                text += delta
+                emitted = True
+                yield {"type": "token", "text": delta}
+
+            if not fn_parts:
+                break
+            if iteration == MAX_TOOL_ITERATIONS:
+                logger.warning(f"Stopping after {MAX_TOOL_ITERATIONS} tool rounds; dropping calls {[p.function_call.name for p in fn_parts]}")
+                break
+
+            conversation.append(types.Content(role="model", parts=([types.Part(text=text)] if text else []) + fn_parts))
+            emitted = True
+            for part in fn_parts:
+                yield {"type": "tool", "name": part.function_call.name}
+            responses = await asyncio.gather(*(run_tool_call(part.function_call, tools_registry) for part in fn_parts))
+            conversation.append(types.Content(role="user", parts=list(responses)))
+            last_result = responses[-1].function_response.response
+
+        if text.strip():
+            conversation.append(types.Content(role="model", parts=[types.Part(text=text.strip())]))
+            yield {"type": "done", "text": text.strip()}
+            return
+
+        if last_result is not None:
+            yield {"type": "done", "text": str(last_result.get("result", last_result.get("error")))}
+            return
+
+        yield {"type": "done", "text": "No valid response received from Gemini."}
+
+    except Exception as e:
+        if is_rate_limit_error(e):
+            gemini_limiter.stats["upstream_throttled"] += 1
+            logger.warning(f"Gemini rate limit hit: {e}")
+            if not emitted:
+                # Nothing reached the client yet, so the whole turn can be refused and retried
+                raise Overloaded("upstream_rate_limited", gemini_limiter.retry_after()) from e
+            yield {"type": "done", "text": "I'm handling a lot of requests right now. Please send your last message again in a few seconds."}
+            return
+        logger.error(f"Gemini tool execution failed: {e}", exc_info=True)
+        yield {"type": "done", "text": f"Gemini tool execution failed: {str(e)}"}
+
+
+async def run_gemini(conversation: ConversationBuilder, tools_registry=None) -> str:
+    output = ""
+    async for event in stream_gemini(conversation, tools_registry):
+        if event["type"] == "done":
+            output = event["text"]
+    return output
+
+
+async def call_tool(name: str, args: dict, registry=None):
+    with span("tool", tool=name) as tool_span:
+        result = await dispatch_tool((registry or tools_registry)[name], args)
+        tool_span.set(result_bytes=len(str(result)))
+    return result
+
+
+fast_path_router = FastPathRouter(call_tool)
+answer_cache = AnswerCache()
+card_catalog.add_refresh_listener(lambda version: answer_cache.clear())
+
+
+async def stream_llm_agents(user_input: str, session_id: str):
+    """
+    Yields events for one user message and persists the turn when it completes. Mechanical inputs
+    are answered by the fast-path router; everything else goes through stream_gemini. Raises
+    Overloaded, before any event, when an LLM-bound turn is not admitted.
+    """
+    try:
+        current_session_id.set(session_id)
+        with trace("turn"):
+            async for event in _turn_events(user_input, session_id):
+                yield event
+
+    except Overloaded:
+        raise
+    except Exception as e:
+        logger.error(f"Agent execution failed: {e}")
+        yield {"type": "done", "text": f"Agent execution failed: {str(e)}"}
+
+
+async def _turn_events(user_input: str, session_id: str):
+    # The store may be SQLite shared between workers (busy timeout 10s); keep it off the event loop
+    record = await asyncio.to_thread(session_store.load, session_id)
+    flow = record.setdefault("flow", {})
+
+    routed = await fast_path_router.route(user_input, flow)
+    if routed:
+        tool_name, output, messages = routed
+        annotate(route="fast_path")
+        yield {"type": "tool", "name": tool_name}
+        record["history"].extend(messages)
+        await asyncio.to_thread(session_store.save, session_id, record)
+        yield {"type": "done", "text": output}
+        return
+
+    with span("prompt.build") as build_span:
+        conversation = ConversationBuilder(record["history"])
+        conversation.append(types.Content(role="user", parts=[types.Part(text=user_input)]))
+        build_span.set(history_messages=len(record["history"]), window_messages=len(conversation.contents()))
+
+    intent, cached = answer_cache.lookup(user_input, flow)
+    if cached is not None:
+        annotate(route="answer_cache")
+        cached_answer, replay = cached
+        new_messages = conversation.new_messages() + replay
+        observe_messages(flow, new_messages)
+        advance_flow(flow, intent)
+        record["history"].extend(new_messages)
+        await asyncio.to_thread(session_store.save, session_id, record)
+        yield {"type": "done", "text": cached_answer}
+        return
+
+    annotate(route="llm")
+    session_limiter.acquire(session_id)
+    async with gemini_limiter.slot():
+        async for event in stream_gemini(conversation, tools_registry):
+            if event["type"] == "done":
+                output = event["text"].strip()
+                conversation.finish(output)
+                new_messages = conversation.new_messages()
+                observe_messages(flow, new_messages)
+                if intent is not None:
+                    advance_flow(flow, intent)
+                    answer_cache.store(intent, output, new_messages)
+                else:
+                    flow["free_text"] = True  # no later turn of this session is cached
+                record["history"].extend(new_messages)
+                await asyncio.to_thread(session_store.save, session_id, record)
+                yield {"type": "done", "text": output}
+            else:
+                yield event
+
+
+async def run_llm_agents(user_input: str, session_id: str) -> str:
+    output = ""
+    async for event in stream_llm_agents(user_input, session_id):
+        if event["type"] == "done":
+            output = event["text"]
+    return output
+    
+
+def test_run_gemini():
+    print("\n--- Running Gemini Test ---")
+    test_prompt = "List the top 3 benefits of using a travel credit card."
+    
+    conversation = ConversationBuilder([])
+    conversation.append(types.Content(role="user", parts=[types.Part(text=test_prompt)]))
+    result = asyncio.run(run_gemini(conversation, tools_registry))
+    print("\nGemini Test Output:\n", result)
+    print("--- Test Complete ---\n")
+
+if __name__ == "__main__":
+
+    test_run_gemini()
@@ -0,0 +1,223 @@
+"""
+Background mail dispatcher: callers enqueue a message and return immediately, a worker thread
+keeps one authenticated SMTP session open, sends queued messages in batches over it and
+retries failed sends with exponential backoff. A message waiting out its backoff is held aside
+with a not-before time, so it never delays the rest of the queue.
+"""
+import heapq
+import itertools
+import os
+import queue
+import smtplib
+import threading
+import time
+import logging
+from tracing import span
+logger = logging.getLogger("Mail-Queue")
+
+EMAIL_HOST = os.getenv("EMAIL_HOST", "smtp.gmail.com")
+EMAIL_PORT = int(os.getenv("EMAIL_PORT", "587"))
+EMAIL_USER = os.getenv("EMAIL_USER", "")
+EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD", "")
+# Set to 0 for a local plain-text SMTP server (e.g. aiosmtpd in tests)
+EMAIL_STARTTLS = os.getenv("EMAIL_STARTTLS", "1") == "1"
+MAIL_QUEUE_SIZE = int(os.getenv("MAIL_QUEUE_SIZE", "1000"))
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "20"))
+MAIL_MAX_RETRIES = int(os.getenv("MAIL_MAX_RETRIES", "3"))
+MAIL_RETRY_BACKOFF = float(os.getenv("MAIL_RETRY_BACKOFF", "1.0"))
+# Close the SMTP session after this long without mail
+MAIL_IDLE_TIMEOUT = float(os.getenv("MAIL_IDLE_TIMEOUT", "60"))
+MAIL_SMTP_TIMEOUT = float(os.getenv("MAIL_SMTP_TIMEOUT", "20"))
+
+
+class MailQueueFull(Exception):
+    pass
+
+
+class MailDispatcher:
+    """
+    `enqueue(sender, recipients, message)` hands a message to the worker and returns at once;
+    it raises MailQueueFull when the bounded queue is full. The worker starts on first use.
+    """
+
+    def __init__(self, host: str = EMAIL_HOST, port: int = EMAIL_PORT, user: str = EMAIL_USER,
+                 password: str = EMAIL_PASSWORD, starttls: bool = EMAIL_STARTTLS, maxsize: int = MAIL_QUEUE_SIZE,
+                 batch_size: int = MAIL_BATCH_SIZE, max_retries: int = MAIL_MAX_RETRIES,
+                 backoff: float = MAIL_RETRY_BACKOFF, idle_timeout: float = MAIL_IDLE_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self._queue = queue.Queue(maxsize)
+        self._server = None
+        self._worker = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._retries = []  # heap of (not before, seq, item); only touched by the worker
+        self._retry_seq = itertools.count()
+        self.stats = {"enqueued": 0, "sent": 0, "failed": 0, "retries": 0, "connects": 0, "batches": 0}
+
+    def enqueue(self, sender: str, recipients, message):
+        """`message` is an email.message.Message or an already-serialized string."""
+        if isinstance(recipients, str):
+            recipients = [recipients]
+        if not all(address.isascii() for address in [sender, *recipients]):
+            # smtplib can only send these with SMTPUTF8, which we don't negotiate
+            raise ValueError(f"Non-ASCII email address in {recipients}")
+        payload = message if isinstance(message, str) else message.as_string()
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((sender, list(recipients), payload, 0))
+        except queue.Full:
+            logger.warning(f"Mail queue full ({self._queue.maxsize}), dropping mail to {recipients}")
+            raise MailQueueFull(f"Mail queue is full ({self._queue.maxsize} messages)")
+        self.stats["enqueued"] += 1
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stopping.clear()
+                self._worker = threading.Thread(target=self._run, name="mail-dispatcher", daemon=True)
+                self._worker.start()
+
+    def _connect(self):
+        with span("smtp.connect"):
+            server = smtplib.SMTP(self.host, self.port, timeout=MAIL_SMTP_TIMEOUT)
+            if self.starttls:
+                server.starttls()
+            if self.user:
+                server.login(self.user, self.password)
+        self.stats["connects"] += 1
+        logger.info(f"Opened SMTP session to {self.host}:{self.port}")
+        return server
+
+    def _session(self, check: bool = False):
+        """The open SMTP session (probed with NOOP when `check`), reconnecting if it was dropped."""
+        if self._server is not None and check:
+            try:
+                if self._server.noop()[0] != 250:
+                    self._close()
+            except (smtplib.SMTPException, OSError):
+                self._close()
+        if self._server is None:
+            self._server = self._connect()
+        return self._server
+
+    def _close(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._server = None
+
+    def _next_batch(self) -> list:
+        """Queued messages plus retries whose backoff has passed; empty after idle_timeout without either."""
+        timeout = self.idle_timeout
+        if self._retries:
+            timeout = min(timeout, max(0.0, self._retries[0][0] - time.monotonic()))
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=timeout))
+        except queue.Empty:
+            pass
+        now = time.monotonic()
+        while self._retries and self._retries[0][0] <= now and len(batch) < self.batch_size:
+            batch.append(heapq.heappop(self._retries)[2])
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._next_batch()
+            if not batch:
+                self._close()  # idle: don't hold the server's connection slot
+                continue
+            self._send_batch(batch)
+        for _, _, (_, recipients, _, _) in self._retries:
+            self.stats["failed"] += 1
+            logger.error(f"Mail dispatcher stopped, dropping retry to {recipients}")
+            self._queue.task_done()
+        self._retries.clear()
+        self._close()
+
+    def _send_batch(self, batch: list):
+        """Sends a batch over one session; a batch starts with a NOOP since the session may have idled."""
+        self.stats["batches"] += 1
+        check = True
+        for item in batch:
+            if item is None:  # stop sentinel
+                self._stopping.set()
+                self._queue.task_done()
+                continue
+            sender, recipients, payload, attempt = item
+            try:
+                session = self._session(check)
+                with span("smtp.send") as send_span:
+                    send_span.set(bytes=len(payload), recipients=len(recipients))
+                    session.sendmail(sender, recipients, payload)
+                check = False
+                self.stats["sent"] += 1
+                logger.info(f"Sent mail to {recipients}")
+            except (smtplib.SMTPException, OSError) as e:
+                self._close()
+                if attempt + 1 >= self.max_retries or isinstance(e, smtplib.SMTPRecipientsRefused):
+                    self.stats["failed"] += 1
+                    logger.error(f"Giving up on mail to {recipients} after {attempt + 1} attempts: {e}")
+                elif len(self._retries) >= self._queue.maxsize > 0:
+                    self.stats["failed"] += 1
+                    logger.error(f"Too many mails awaiting retry, dropping mail to {recipients}: {e}")
+                else:
+                    self._schedule_retry((sender, recipients, payload, attempt + 1))
+                    logger.warning(f"Mail to {recipients} failed (attempt {attempt + 1}), will retry: {e}")
+                    continue  # still an open task until the retry is sent or given up on
+            except Exception as e:
+                # Anything else is a bad message, not a bad connection: drop it and keep the worker alive
+                self._close()
+                self.stats["failed"] += 1
+                logger.error(f"Giving up on mail to {recipients}: {type(e).__name__}: {e}")
+            self._queue.task_done()
+
+    def _schedule_retry(self, item: tuple):
+        delay = self.backoff * 2 ** (item[3] - 1)
+        self.stats["retries"] += 1
+        heapq.heappush(self._retries, (time.monotonic() + delay, next(self._retry_seq), item))
+
+    def join(self):
+        """Blocks until every queued message has been sent or given up on."""
+        self._queue.join()
+
+    def stop(self, timeout: float = 10.0):
+        """
+        Flushes what is already queued, then closes the SMTP session and stops the worker. If the queue
+        stays full for `timeout` the worker is stopped after its current batch instead; mail waiting out
+        a retry backoff is dropped either way.
+        """
+        if self._worker is None or not self._worker.is_alive():
+            return
+        deadline = time.monotonic() + timeout
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            logger.warning(f"Mail queue still full after {timeout}s, stopping without flushing it")
+            self._stopping.set()
+        self._worker.join(max(0.0, deadline - time.monotonic()))
+
+    def qsize(self) -> int:
+        """Messages queued or waiting out a retry backoff."""
+        return self._queue.qsize() + len(self._retries)
+
+
+mail_dispatcher = MailDispatcher()
@@ -1,27 +1,225 @@
-from fastapi import FastAPI, Request
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
-from llm_agents import run_llm_agents
-app = FastAPI()
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"], 
-    allow_methods=["*"],
-    allow_headers=["*"]
-)
-
-app.mount("/static", StaticFiles(directory="Frontend/static"), name="static")
-templates = Jinja2Templates(directory="Frontend")
-
-@app.get("/", response_class=HTMLResponse)
-async def get_index(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
-
-@app.post("/chat")
-async def chat(data: dict):
-    user_input = data.get("input")
-    response = run_llm_agents(user_input)
-    return {"response": response}
\ No newline at end of file
+import asyncio
+import hmac
+import os
+import io
+import json
+import tempfile
+from fastapi import FastAPI, Request, Response, Depends, Header, HTTPException, Query
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import HTMLResponse, StreamingResponse, PlainTextResponse, JSONResponse
+from llm_agents import run_llm_agents, stream_llm_agents, fast_path_router, answer_cache, card_response_cache
+from session_store import session_store, InMemorySessionBackend, STATELESS_WORKERS
+from otp_store import InMemoryOTPBackend
+from otp_simulator import otp_store
+from db_operations import card_catalog, invalidate_bureau_cache, bureau_cache, profile_prefetcher
+from mail_queue import mail_dispatcher
+from db_pool import pool
+from prompt_cache import token_stats
+from tracing import metrics
+import bulk_eligibility
+import lazy_imports
+import tool_output
+from admission import Overloaded, gemini_limiter, session_limiter
+from static_assets import StaticSite, INDEX_CACHE_CONTROL
+app = FastAPI()
+
+SESSION_COOKIE = "session_id"
+# Shared secret for the /admin endpoints (X-Admin-Token header); unset keeps them disabled
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_methods=["*"],
+    allow_headers=["*"]
+)
+
+# index.html and Frontend/static, read and compressed once; assets get content-hashed URLs
+static_site = StaticSite()
+
+def require_admin(x_admin_token: str = Header(default="")):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+def _set_session_cookie(response: Response, session_id: str):
+    response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite="lax")
+
+def _overloaded_response(error: Overloaded, session_id: str) -> JSONResponse:
+    return JSONResponse(
+        {"error": error.reason, "retry_after": error.retry_after, "session_id": session_id},
+        status_code=429,
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
+def _require_input(data: dict) -> str:
+    """The chat message from a request body; 422 when it is missing, blank or not a string."""
+    user_input = data.get("input")
+    if not isinstance(user_input, str) or not user_input.strip():
+        raise HTTPException(status_code=422, detail="'input' must be a non-empty string")
+    return user_input
+
+async def _resolve_session(session_id: str) -> tuple:
+    """(session_id, new): the client's id if the store issued it and it is still live, else a freshly issued one."""
+    if session_id and await asyncio.to_thread(session_store.exists, session_id):
+        return session_id, False
+    return await asyncio.to_thread(session_store.new_session), True
+
+@app.api_route("/", methods=["GET", "HEAD"], response_class=HTMLResponse)
+async def get_index(request: Request):
+    response = static_site.respond(request, static_site.index, INDEX_CACHE_CONTROL)
+    session_id, new_session = await _resolve_session(request.cookies.get(SESSION_COOKIE))
+    if new_session:
+        _set_session_cookie(response, session_id)
+    return response
+
+@app.api_route("/static/{name:path}", methods=["GET", "HEAD"])
+async def get_static(name: str, request: Request):
+    asset, cache_control = static_site.lookup(name)
+    if asset is None:
+        return PlainTextResponse("Not Found", status_code=404)
+    return static_site.respond(request, asset, cache_control)
+
+@app.post("/reset")
+async def reset(request: Request, response: Response):
+    old_session_id = request.cookies.get(SESSION_COOKIE)
+    await asyncio.to_thread(session_store.reset, old_session_id)
+    if old_session_id:
+        profile_prefetcher.cancel(old_session_id)
+        invalidate_bureau_cache(session_id=old_session_id)
+    session_id = await asyncio.to_thread(session_store.new_session)
+    _set_session_cookie(response, session_id)
+    return {"session_id": session_id}
+
+@app.post("/chat")
+async def chat(data: dict, request: Request, response: Response):
+    user_input = _require_input(data)
+    session_id, new_session = await _resolve_session(data.get("session_id") or request.cookies.get(SESSION_COOKIE))
+    if new_session:
+        _set_session_cookie(response, session_id)
+    try:
+        reply = await run_llm_agents(user_input, session_id)
+    except Overloaded as e:
+        rejected = _overloaded_response(e, session_id)
+        if new_session:
+            _set_session_cookie(rejected, session_id)
+        return rejected
+    return {"response": reply, "session_id": session_id}
+
+@app.post("/chat/stream")
+async def chat_stream(data: dict, request: Request):
+    """Server-Sent Events version of /chat: `token`, `tool` and a final `done` event per message."""
+    user_input = _require_input(data)
+    session_id, new_session = await _resolve_session(data.get("session_id") or request.cookies.get(SESSION_COOKIE))
+
+    # Admission is decided before the first event, so pull it here while a 429 can still be sent
+    agent_events = stream_llm_agents(user_input, session_id)
+    try:
+        first = await agent_events.__anext__()
+    except Overloaded as e:
+        response = _overloaded_response(e, session_id)
+        if new_session:
+            _set_session_cookie(response, session_id)
+        return response
+    except StopAsyncIteration:
+        first = None
+
+    async def events():
+        if first is None:
+            return
+        yield f"event: {first['type']}\ndata: {json.dumps(first, ensure_ascii=False)}\n\n"
+        async for event in agent_events:
+            yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    response = StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    if new_session:
+        _set_session_cookie(response, session_id)
+    return response
+
+@app.post("/admin/catalog/refresh", dependencies=[Depends(require_admin)])
+async def refresh_catalog():
+    await asyncio.to_thread(card_catalog.refresh)
+    return {"version": card_catalog.version, "cards": len(card_catalog)}
+
+@app.post("/admin/eligibility/bulk", dependencies=[Depends(require_admin)])
+async def bulk_eligibility_check(request: Request, keyword: str = None,
+                                 output_format: str = Query("jsonl", alias="format"),
+                                 max_cards: int = bulk_eligibility.BULK_MAX_CARDS):
+    """
+    Body: PANs, one per line (or comma separated). The upload is spooled to disk past a few MB, then
+    one JSONL/CSV result per PAN is streamed back; each chunk of PANs costs one DB query. The spooled
+    file may roll over to disk, so every read and write of it runs in a worker thread.
+    """
+    # The body has to be read before streaming starts: StreamingResponse listens on `receive` for disconnects
+    upload = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    async for data in request.stream():
+        await asyncio.to_thread(upload.write, data)
+    upload.seek(0)
+    encode = bulk_eligibility.to_csv if output_format == "csv" else bulk_eligibility.to_jsonl
+
+    async def results():
+        with upload, io.TextIOWrapper(upload, encoding="utf-8", errors="replace") as text:
+            chunks = bulk_eligibility.chunked(bulk_eligibility.read_pans(text))
+
+            def next_results():
+                """Reads the next chunk of PANs and evaluates it; None once the upload is exhausted."""
+                chunk = next(chunks, None)
+                return None if chunk is None else bulk_eligibility.evaluate_chunk(chunk, keyword, max_cards)
+
+            if output_format == "csv":
+                yield bulk_eligibility.csv_header()
+            while (rows := await asyncio.to_thread(next_results)) is not None:
+                yield encode(rows)
+
+    media_type = "text/csv" if output_format == "csv" else "application/x-ndjson"
+    return StreamingResponse(results(), media_type=media_type)
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text exposition of turn spans plus pool, cache, queue and token counters."""
+    # Some collectors query the stores (session and OTP counts), so render off the event loop
+    return PlainTextResponse(await asyncio.to_thread(metrics.render), media_type="text/plain; version=0.0.4")
+
+# Monotonic fields of each collector, exported as Prometheus counters; everything else is a gauge
+CACHE_COUNTERS = ("hits", "misses", "evictions")
+metrics.add_collector("db_pool", pool.metrics, counters=("created", "closed", "checkouts", "reconnects",
+                      "health_check_failures", "query_errors", "queries", "wait_seconds_total"))
+metrics.add_collector("gemini", token_stats.snapshot, counters=("calls", "prompt_tokens", "cached_tokens", "output_tokens"))
+metrics.add_collector("fast_path", lambda: fast_path_router.stats, counters=("routed", "llm"))
+metrics.add_collector("answer_cache", answer_cache.stats, counters=CACHE_COUNTERS)
+metrics.add_collector("card_response_cache", card_response_cache.stats, counters=CACHE_COUNTERS)
+metrics.add_collector("bureau_cache", bureau_cache.stats, counters=CACHE_COUNTERS)
+metrics.add_collector("prefetch", lambda: {**profile_prefetcher.stats, "pending": profile_prefetcher.pending()},
+                      counters=("started", "completed", "failed", "cancelled", "waited"))
+metrics.add_collector("tool_output", tool_output.metrics, counters=("pages", "tokens", "json_tokens", "trimmed_rows"))
+metrics.add_collector("static", lambda: static_site.stats, counters=("served", "not_modified", "bytes_sent"))
+metrics.add_collector("admission", lambda: {**gemini_limiter.metrics(), "session_rate_limited": session_limiter.limited},
+                      counters=("admitted", "queued", "rejected_queue_full", "rejected_timeout", "upstream_throttled",
+                                "wait_seconds_total", "session_rate_limited"))
+metrics.add_collector("mail_queue", lambda: {**mail_dispatcher.stats, "depth": mail_dispatcher.qsize()},
+                      counters=("enqueued", "sent", "failed", "retries", "connects", "batches"))
+metrics.add_collector("store", lambda: {"sessions": len(session_store.backend), "otps": len(otp_store),
+                                         "catalog_cards": len(card_catalog)})
+
+@app.on_event("startup")
+async def check_worker_mode():
+    """In stateless worker mode any in-process store would split state between workers, so refuse to start."""
+    if not STATELESS_WORKERS:
+        return
+    if isinstance(session_store.backend, InMemorySessionBackend) or isinstance(otp_store.backend, InMemoryOTPBackend):
+        raise RuntimeError("STATELESS_WORKERS=1 needs external stores: set SESSION_BACKEND=sqlite and OTP_BACKEND=sqlite")
+
+@app.on_event("startup")
+async def warm_deferred_imports():
+    """Loads google.genai / numpy in the background so the first chat turn doesn't pay for them."""
+    asyncio.get_running_loop().run_in_executor(None, lazy_imports.warm_up)
+
+@app.on_event("shutdown")
+async def flush_mail_queue():
+    profile_prefetcher.shutdown()
+    await asyncio.to_thread(mail_dispatcher.stop)
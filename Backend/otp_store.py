@@ -0,0 +1,245 @@
+import heapq
+import hmac
+import os
+import sqlite3
+import threading
+import time
+import logging
+logger = logging.getLogger("OTP-Store")
+
+STATELESS_WORKERS = os.getenv("STATELESS_WORKERS", "0") == "1"
+# "memory" or "sqlite" (shared by all workers on a host)
+OTP_BACKEND = os.getenv("OTP_BACKEND", "sqlite" if STATELESS_WORKERS else "memory")
+OTP_DB_PATH = os.getenv("OTP_DB_PATH", "otp.db")
+OTP_TTL_SECONDS = float(os.getenv("OTP_TTL_SECONDS", "300"))
+OTP_MAX_ATTEMPTS = int(os.getenv("OTP_MAX_ATTEMPTS", "5"))
+OTP_MAX_ENTRIES = int(os.getenv("OTP_MAX_ENTRIES", "100000"))
+OTP_SWEEP_INTERVAL = float(os.getenv("OTP_SWEEP_INTERVAL", "30"))
+
+# Outcomes of backend.check()
+OK, MISSING, EXPIRED, INVALID, LOCKED = "ok", "missing", "expired", "invalid", "locked"
+
+
+class InMemoryOTPBackend:
+    """
+    Dict of live OTPs plus a min-heap of expiry times, so a sweep only touches expired entries.
+    Re-issued keys leave stale heap items behind; they are skipped when popped and the heap is
+    rebuilt once they outnumber the live entries.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data = {}  # key -> [otp, expires_at, attempts]
+        self._heap = []  # (expires_at, key)
+        self._lock = threading.Lock()
+
+    def put(self, key: str, otp: str, expires_at: float):
+        with self._lock:
+            self._data[key] = [otp, expires_at, 0]
+            heapq.heappush(self._heap, (expires_at, key))
+            while len(self._data) > self.max_entries:
+                self._pop_earliest()
+            if len(self._heap) > 2 * len(self._data) + 64:
+                self._heap = [(entry[1], k) for k, entry in self._data.items()]
+                heapq.heapify(self._heap)
+
+    def _pop_earliest(self):
+        expires_at, key = heapq.heappop(self._heap)
+        entry = self._data.get(key)
+        if entry is not None and entry[1] == expires_at:
+            del self._data[key]
+
+    def check(self, key: str, otp: str, now: float, max_attempts: int) -> str:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return MISSING
+            if now > entry[1]:
+                del self._data[key]
+                return EXPIRED
+            if hmac.compare_digest(entry[0], otp):
+                del self._data[key]
+                return OK
+            entry[2] += 1
+            if entry[2] >= max_attempts:
+                del self._data[key]
+                return LOCKED
+            return INVALID
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def sweep(self, now: float) -> int:
+        removed = 0
+        with self._lock:
+            while self._heap and self._heap[0][0] < now:
+                expires_at, key = heapq.heappop(self._heap)
+                entry = self._data.get(key)
+                if entry is not None and entry[1] == expires_at:
+                    del self._data[key]
+                    removed += 1
+        return removed
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteOTPBackend:
+    """OTPs in a SQLite file, so every worker process on the host sees the same codes."""
+
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS otps ("
+            " otp_key TEXT PRIMARY KEY, otp TEXT NOT NULL, expires_at REAL NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_otps_expires_at ON otps(expires_at)")
+
+    def put(self, key: str, otp: str, expires_at: float):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO otps (otp_key, otp, expires_at, attempts) VALUES (?, ?, ?, 0) "
+                    "ON CONFLICT(otp_key) DO UPDATE SET otp = excluded.otp, expires_at = excluded.expires_at, "
+                    "attempts = 0",
+                    (key, otp, expires_at),
+                )
+                self._conn.execute(
+                    "DELETE FROM otps WHERE otp_key IN ("
+                    " SELECT otp_key FROM otps ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def check(self, key: str, otp: str, now: float, max_attempts: int) -> str:
+        """Read and update under one write transaction so concurrent workers can't both consume an OTP."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT otp, expires_at, attempts FROM otps WHERE otp_key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    outcome = MISSING
+                elif now > row[1]:
+                    outcome = EXPIRED
+                elif hmac.compare_digest(row[0], otp):
+                    outcome = OK
+                elif row[2] + 1 >= max_attempts:
+                    outcome = LOCKED
+                else:
+                    outcome = INVALID
+                if outcome == INVALID:
+                    self._conn.execute("UPDATE otps SET attempts = attempts + 1 WHERE otp_key = ?", (key,))
+                elif outcome != MISSING:
+                    self._conn.execute("DELETE FROM otps WHERE otp_key = ?", (key,))
+                self._conn.execute("COMMIT")
+                return outcome
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM otps WHERE otp_key = ?", (key,))
+
+    def sweep(self, now: float) -> int:
+        with self._lock:
+            return self._conn.execute("DELETE FROM otps WHERE expires_at < ?", (now,)).rowcount
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM otps").fetchone()[0]
+
+
+class OTPStore:
+    """
+    One-time codes keyed by (kind, id), e.g. ("email", address) or ("aadhaar", number).
+    A code is deleted as soon as it is used, expires, or has been guessed wrong max_attempts times.
+    Expired codes are swept every `sweep_interval` seconds by a background thread started with the
+    first issue(), so they don't linger on a server that has gone quiet.
+    """
+
+    ERRORS = {
+        MISSING: "No OTP found for this {kind}",
+        EXPIRED: "OTP expired",
+        INVALID: "Invalid OTP",
+        LOCKED: "Too many invalid attempts. Please request a new OTP",
+    }
+
+    def __init__(self, backend, ttl: float = OTP_TTL_SECONDS, max_attempts: int = OTP_MAX_ATTEMPTS,
+                 sweep_interval: float = OTP_SWEEP_INTERVAL):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+        self.sweep_interval = sweep_interval
+        self._last_sweep = time.time()
+        self._sweeper = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(kind: str, identifier: str) -> str:
+        return f"{kind}:{identifier}"
+
+    def issue(self, kind: str, identifier: str, otp: str, ttl: float = None):
+        now = time.time()
+        self._ensure_sweeper()
+        self._maybe_sweep(now)
+        self.backend.put(self._key(kind, identifier), otp, now + (self.ttl if ttl is None else ttl))
+
+    def verify(self, kind: str, identifier: str, otp: str) -> dict:
+        now = time.time()
+        self._maybe_sweep(now)
+        outcome = self.backend.check(self._key(kind, identifier), str(otp), now, self.max_attempts)
+        if outcome == OK:
+            return {"success": True}
+        if outcome == LOCKED:
+            logger.warning(f"OTP for {kind} {identifier} locked after {self.max_attempts} invalid attempts")
+        return {"success": False, "error": self.ERRORS[outcome].format(kind=kind)}
+
+    def discard(self, kind: str, identifier: str):
+        self.backend.delete(self._key(kind, identifier))
+
+    def _ensure_sweeper(self):
+        if self._sweeper is not None:
+            return
+        with self._lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep_loop, name="otp-sweeper", daemon=True)
+                self._sweeper.start()
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self._maybe_sweep(time.time())
+            except Exception as e:
+                logger.error(f"OTP sweep failed: {e}")
+
+    def _maybe_sweep(self, now: float):
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        removed = self.backend.sweep(now)
+        if removed:
+            logger.info(f"Swept {removed} expired OTPs")
+
+    def __len__(self):
+        return len(self.backend)
+
+
+def build_otp_store() -> OTPStore:
+    if OTP_BACKEND == "sqlite":
+        backend = SQLiteOTPBackend(OTP_DB_PATH, OTP_MAX_ENTRIES)
+    else:
+        backend = InMemoryOTPBackend(OTP_MAX_ENTRIES)
+    return OTPStore(backend)
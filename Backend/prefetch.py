@@ -0,0 +1,108 @@
+"""
+Per-session background prefetch. A job is started when the next steps of a session are predictable
+(e.g. the bureau profile right after identity verification); callers that need its result wait for
+the session's pending job for a bounded time and otherwise fall back to their own lookup. Jobs are
+cancelled when the session resets, and a job cancelled mid-flight never publishes its result.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import logging
+logger = logging.getLogger("Prefetch")
+
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "1") == "1"
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "4"))
+PREFETCH_WAIT_SECONDS = float(os.getenv("PREFETCH_WAIT_SECONDS", "2"))
+
+
+class _Job:
+    __slots__ = ("future", "cancelled")
+
+    def __init__(self):
+        self.future = None
+        self.cancelled = False
+
+
+class Prefetcher:
+    """
+    At most one pending job per session. `fn(*args)` computes the result off the request path and
+    `publish(result)` stores it (e.g. seeds a cache); publish runs under the prefetcher's lock, so it
+    cannot race with cancel().
+    """
+
+    def __init__(self, workers: int = PREFETCH_WORKERS, enabled: bool = PREFETCH_ENABLED):
+        self.enabled = enabled
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._jobs = {}  # session_id -> _Job
+        self.stats = {"started": 0, "completed": 0, "failed": 0, "cancelled": 0, "waited": 0}
+
+    def start(self, session_id: str, fn, publish, *args) -> bool:
+        if not self.enabled or not session_id:
+            return False
+        job = _Job()
+        with self._lock:
+            previous = self._jobs.get(session_id)
+            if previous is not None:
+                self._cancel(previous)
+            self._jobs[session_id] = job
+            self.stats["started"] += 1
+            job.future = self._executor.submit(self._run, session_id, job, fn, publish, args)
+        return True
+
+    def _run(self, session_id: str, job: _Job, fn, publish, args):
+        try:
+            result = fn(*args)
+        except Exception as e:
+            logger.warning(f"Prefetch for session {session_id} failed: {e}")
+            with self._lock:
+                self.stats["failed"] += 1
+                self._forget(session_id, job)
+            return
+        with self._lock:
+            if not job.cancelled:
+                publish(result)
+                self.stats["completed"] += 1
+            self._forget(session_id, job)
+
+    def _forget(self, session_id: str, job: _Job):
+        if self._jobs.get(session_id) is job:
+            del self._jobs[session_id]
+
+    def _cancel(self, job: _Job):
+        job.cancelled = True
+        if job.future is not None:
+            job.future.cancel()
+        self.stats["cancelled"] += 1
+
+    def wait(self, session_id: str, timeout: float = PREFETCH_WAIT_SECONDS) -> bool:
+        """Blocks until the session's pending job (if any) finishes; False if it is still running after `timeout`."""
+        with self._lock:
+            job = self._jobs.get(session_id)
+            if job is None:
+                return True
+            self.stats["waited"] += 1
+        try:
+            job.future.result(timeout=timeout)
+        except TimeoutError:
+            logger.info(f"Prefetch for session {session_id} still running after {timeout}s; loading directly")
+            return False
+        except Exception:
+            pass
+        return True
+
+    def cancel(self, session_id: str) -> bool:
+        with self._lock:
+            job = self._jobs.pop(session_id, None)
+            if job is None:
+                return False
+            self._cancel(job)
+        logger.info(f"Cancelled prefetch for session {session_id}")
+        return True
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._jobs)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,140 @@
+import os
+import time
+import asyncio
+import threading
+import datetime
+import logging
+from lazy_imports import lazy_module
+types = lazy_module("google.genai.types")
+logger = logging.getLogger("Prompt-Cache")
+
+PROMPT_CACHE_ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "1") == "1"
+PROMPT_CACHE_TTL_SECONDS = int(os.getenv("PROMPT_CACHE_TTL_SECONDS", "3600"))
+# Refresh the TTL once less than this much lifetime is left
+PROMPT_CACHE_REFRESH_MARGIN = int(os.getenv("PROMPT_CACHE_REFRESH_MARGIN", "300"))
+# After a failed create (e.g. prompt below the model's minimum cacheable size) wait this long before retrying
+PROMPT_CACHE_RETRY_SECONDS = int(os.getenv("PROMPT_CACHE_RETRY_SECONDS", "600"))
+
+
+class SystemPromptCache:
+    """
+    Holds the Gemini cached-content handle for the static system prompt and tool declarations.
+    Falls back to sending them inline as system_instruction/tools when caching is unavailable.
+    """
+
+    def __init__(self, client, model: str, system_prompt: str, enabled: bool = PROMPT_CACHE_ENABLED,
+                 ttl_seconds: int = PROMPT_CACHE_TTL_SECONDS):
+        self.client = client
+        self.model = model
+        self.system_prompt = system_prompt
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self._name = None
+        self._expires_at = 0.0
+        self._tools = None
+        self._retry_at = 0.0
+        self._lock = None  # asyncio.Lock, created lazily inside the running loop
+
+    def inline(self, tools) -> dict:
+        return {"system_instruction": self.system_prompt, "tools": list(tools)}
+
+    async def config_kwargs(self, tools) -> dict:
+        """Keyword arguments for GenerateContentConfig: either cached_content or the inline prompt."""
+        if not self.enabled or time.time() < self._retry_at:
+            return self.inline(tools)
+        now = time.time()
+        if self._name and self._tools is tools and now < self._expires_at - PROMPT_CACHE_REFRESH_MARGIN:
+            return {"cached_content": self._name}
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            now = time.time()
+            try:
+                if self._name and self._tools is tools and now < self._expires_at:
+                    if now >= self._expires_at - PROMPT_CACHE_REFRESH_MARGIN:
+                        await self._extend()
+                else:
+                    await self._create(tools)
+                return {"cached_content": self._name}
+            except Exception as e:
+                logger.warning(f"Prompt cache unavailable, sending system prompt inline: {e}")
+                self.invalidate()
+                self._retry_at = time.time() + PROMPT_CACHE_RETRY_SECONDS
+                return self.inline(tools)
+
+    async def _create(self, tools):
+        cached = await self.client.aio.caches.create(
+            model=self.model,
+            config=types.CreateCachedContentConfig(
+                display_name="credit-card-agent-system-prompt",
+                system_instruction=self.system_prompt,
+                tools=list(tools),
+                ttl=f"{self.ttl_seconds}s",
+            ),
+        )
+        self._name = cached.name
+        self._tools = tools
+        self._expires_at = self._expiry(cached)
+        logger.info(f"Created prompt cache {self._name}")
+
+    async def _extend(self):
+        cached = await self.client.aio.caches.update(
+            name=self._name,
+            config=types.UpdateCachedContentConfig(ttl=f"{self.ttl_seconds}s"),
+        )
+        self._expires_at = self._expiry(cached)
+        logger.info(f"Extended prompt cache {self._name}")
+
+    def _expiry(self, cached) -> float:
+        if cached.expire_time:
+            return cached.expire_time.replace(tzinfo=cached.expire_time.tzinfo or datetime.timezone.utc).timestamp()
+        return time.time() + self.ttl_seconds
+
+    def invalidate(self):
+        """Forget the handle, e.g. after the API reports the cache expired or was deleted."""
+        self._name = None
+        self._tools = None
+        self._expires_at = 0.0
+
+
+def is_cache_miss_error(exc: Exception) -> bool:
+    text = str(exc).lower()
+    return "cachedcontent" in text.replace(" ", "").replace("_", "") or "cached content" in text
+
+
+class TokenStats:
+    """Running prompt-token counters, including how many prompt tokens were served from cache."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.output_tokens = 0
+
+    def record(self, response) -> dict:
+        usage = getattr(response, "usage_metadata", None)
+        prompt = (usage.prompt_token_count or 0) if usage else 0
+        cached = (usage.cached_content_token_count or 0) if usage else 0
+        output = (usage.candidates_token_count or 0) if usage else 0
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt
+            self.cached_tokens += cached
+            self.output_tokens += output
+        saved = (100.0 * cached / prompt) if prompt else 0.0
+        logger.debug(f"Gemini tokens: prompt={prompt} cached={cached} ({saved:.0f}% from cache) output={output}")
+        return {"prompt": prompt, "cached": cached, "output": output}
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "output_tokens": self.output_tokens,
+            }
+
+
+token_stats = TokenStats()
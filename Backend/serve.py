@@ -0,0 +1,29 @@
+"""
+Runs the app as N stateless uvicorn worker processes sharing one port.
+
+    python serve.py --workers 4 --port 8000
+
+Session history, flow progress and OTPs go to the SQLite stores (SESSION_DB_PATH, OTP_DB_PATH), so any
+worker can serve any request. Caches (catalog, bureau rows, prompt cache handle) stay per process.
+"""
+import argparse
+import os
+import uvicorn
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the credit card assistant with multiple workers")
+    parser.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))))
+    args = parser.parse_args()
+
+    # Inherited by the worker processes before they import the app
+    os.environ["STATELESS_WORKERS"] = "1"
+    os.environ.setdefault("SESSION_BACKEND", "sqlite")
+    os.environ.setdefault("OTP_BACKEND", "sqlite")
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
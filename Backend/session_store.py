@@ -0,0 +1,202 @@
+import contextvars
+import json
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+from conversation import split_turns
+logger = logging.getLogger("Session-Store")
+
+# Stateless worker mode (see serve.py): every process keeps its state in the shared external stores
+STATELESS_WORKERS = os.getenv("STATELESS_WORKERS", "0") == "1"
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "sqlite" if STATELESS_WORKERS else "memory")  # "memory" or "sqlite"
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "1800"))
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "5000"))
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "40"))
+SESSION_MAX_CHARS = int(os.getenv("SESSION_MAX_CHARS", "24000"))
+
+# Format of the ids new_session() issues (secrets.token_urlsafe(16))
+SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{22}$")
+
+# Session the current agent turn belongs to; tool threads inherit it via contextvars
+current_session_id = contextvars.ContextVar("current_session_id", default=None)
+
+
+def new_record() -> dict:
+    return {"history": [], "flow": {}}
+
+
+class InMemorySessionBackend:
+    """In-process LRU of session records. Oldest-accessed sessions are evicted first."""
+
+    def __init__(self, max_sessions: int):
+        self.max_sessions = max_sessions
+        self._data = OrderedDict()  # session_id -> (last_access, record)
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str):
+        with self._lock:
+            entry = self._data.get(session_id)
+            if entry is None:
+                return None
+            self._data.move_to_end(session_id)
+            return entry
+
+    def put(self, session_id: str, record: dict, now: float):
+        with self._lock:
+            self._data[session_id] = (now, record)
+            self._data.move_to_end(session_id)
+            while len(self._data) > self.max_sessions:
+                evicted, _ = self._data.popitem(last=False)
+                logger.info(f"Evicted session {evicted} (LRU, limit {self.max_sessions})")
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._data.pop(session_id, None)
+
+    def sweep(self, cutoff: float) -> int:
+        with self._lock:
+            expired = [sid for sid, (last, _) in self._data.items() if last < cutoff]
+            for sid in expired:
+                del self._data[sid]
+            return len(expired)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteSessionBackend:
+    """Session records persisted as JSON in a local SQLite file."""
+
+    def __init__(self, path: str, max_sessions: int):
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY, data TEXT NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_last_access ON sessions(last_access)")
+        self._conn.commit()
+
+    def get(self, session_id: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_access, data FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def put(self, session_id: str, record: dict, now: float):
+        data = json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, data, last_access) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET data = excluded.data, last_access = excluded.last_access",
+                (session_id, data, now),
+            )
+            self._conn.execute(
+                "DELETE FROM sessions WHERE session_id IN ("
+                " SELECT session_id FROM sessions ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_sessions,),
+            )
+            self._conn.commit()
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def sweep(self, cutoff: float) -> int:
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM sessions WHERE last_access < ?", (cutoff,))
+            self._conn.commit()
+            return cur.rowcount
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+class SessionStore:
+    """Session-keyed conversation memory with bounded history and idle-session eviction."""
+
+    def __init__(self, backend, ttl: float = SESSION_TTL_SECONDS, max_turns: int = SESSION_MAX_TURNS,
+                 max_chars: int = SESSION_MAX_CHARS, sweep_interval: float = 60.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self.max_chars = max_chars
+        self.sweep_interval = sweep_interval
+        self._last_sweep = time.time()
+
+    def new_session(self) -> str:
+        session_id = secrets.token_urlsafe(16)
+        self.backend.put(session_id, new_record(), time.time())
+        return session_id
+
+    def exists(self, session_id: str) -> bool:
+        """True for a live session this store issued; client-chosen or expired ids are not accepted."""
+        if not session_id or not SESSION_ID_RE.match(session_id):
+            return False
+        entry = self.backend.get(session_id)
+        return entry is not None and time.time() - entry[0] <= self.ttl
+
+    def load(self, session_id: str) -> dict:
+        """Returns the session record, or a fresh one if the session is unknown or expired."""
+        now = time.time()
+        self._maybe_sweep(now)
+        entry = self.backend.get(session_id) if session_id else None
+        if entry is None:
+            return new_record()
+        last_access, record = entry
+        if now - last_access > self.ttl:
+            self.backend.delete(session_id)
+            return new_record()
+        return record
+
+    def save(self, session_id: str, record: dict):
+        self._trim(record["history"])
+        self.backend.put(session_id, record, time.time())
+
+    def reset(self, session_id: str):
+        if session_id:
+            self.backend.delete(session_id)
+
+    def _trim(self, history: list):
+        """Drops the oldest whole turns until the history fits the turn and character budget."""
+        turns = split_turns(history)
+        sizes = [len(json.dumps(turn, ensure_ascii=False)) for turn in turns]
+        total = sum(sizes)
+        drop = 0
+        while drop < len(turns) - 1 and (len(turns) - drop > self.max_turns or total > self.max_chars):
+            total -= sizes[drop]
+            drop += 1
+        if drop:
+            del history[:sum(len(turn) for turn in turns[:drop])]
+
+    def _maybe_sweep(self, now: float):
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        removed = self.backend.sweep(now - self.ttl)
+        if removed:
+            logger.info(f"Swept {removed} idle sessions")
+
+
+def build_session_store() -> SessionStore:
+    if SESSION_BACKEND == "sqlite":
+        backend = SQLiteSessionBackend(SESSION_DB_PATH, SESSION_MAX_SESSIONS)
+    else:
+        backend = InMemorySessionBackend(SESSION_MAX_SESSIONS)
+    return SessionStore(backend)
+
+
+session_store = build_session_store()
@@ -0,0 +1,83 @@
+"""
+Cold-start check: imports the app in fresh interpreters under `python -X importtime` and fails when the
+import takes longer than the budget or pulls in a module that should only load on first use.
+
+    python startup_benchmark.py                          # import main, 5 runs
+    python startup_benchmark.py --module llm_agents --budget-ms 300
+    python startup_benchmark.py --forbid langchain --top 20
+
+Exits 1 on a regression, so it can run in CI next to the load benchmark.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "1000"))
+# Loaded lazily (lazy_imports.py) or not at all; importing any of them at startup is a regression
+DEFERRED_MODULES = ("langchain", "langchain_core", "google.genai", "numpy", "mysql.connector")
+
+_LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def measure(module: str) -> list[tuple]:
+    """(name, self_us, cumulative_us, depth) for every module imported by `import <module>` in a fresh interpreter."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="0")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure and budget the app's import time")
+    parser.add_argument("--module", default="main", help="Module to import (default: main)")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to measure; the median counts")
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS, help="Maximum median import time")
+    parser.add_argument("--forbid", action="append", help="Module that must not be imported at startup "
+                        f"(repeatable; default: {', '.join(DEFERRED_MODULES)})")
+    parser.add_argument("--top", type=int, default=10, help="Heaviest direct imports to list")
+    args = parser.parse_args()
+    forbidden = tuple(args.forbid or DEFERRED_MODULES)
+
+    measure(args.module)  # compile .pyc files so the measured runs see a warm bytecode cache
+    runs = [measure(args.module) for _ in range(args.runs)]
+    totals = [next(cumulative for name, _, cumulative, _ in rows if name == args.module) / 1000 for rows in runs]
+    median = statistics.median(totals)
+
+    last = runs[-1]
+    target_depth = next(depth for name, _, _, depth in last if name == args.module)
+    children = sorted(((cumulative, name) for name, _, cumulative, depth in last if depth == target_depth + 1),
+                      reverse=True)
+    imported = {name for name, _, _, _ in last}
+    eager = [f for f in forbidden if any(name == f or name.startswith(f + ".") for name in imported)]
+
+    print(f"import {args.module}: median {median:.1f} ms over {args.runs} runs "
+          f"(min {min(totals):.1f}, max {max(totals):.1f}), budget {args.budget_ms:.0f} ms")
+    print("Heaviest direct imports:")
+    for cumulative, name in children[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    failed = False
+    if median > args.budget_ms:
+        print(f"FAIL: import time {median:.1f} ms is over the {args.budget_ms:.0f} ms budget")
+        failed = True
+    if eager:
+        print(f"FAIL: imported at startup but should load on first use: {', '.join(eager)}")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+In-memory serving of the chat frontend. `index.html` and every file under `static/` are read once at
+startup; static files get a content-hashed URL (`/static/logo.3f2a9c1d0b.png`) that the index is
+rewritten to use, so they can be cached for a year, and the index itself is revalidated by ETag.
+Compressible files are pre-compressed with gzip (and brotli when the `brotli` package is installed)
+and the variant is picked from Accept-Encoding. Conditional requests get a bodiless 304.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+import logging
+from fastapi import Request, Response
+logger = logging.getLogger("Static-Assets")
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+FRONTEND_DIR = os.getenv("FRONTEND_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "Frontend"))
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "300"))  # un-fingerprinted /static URLs
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+INDEX_CACHE_CONTROL = "no-cache"  # always revalidated, answered with 304 while unchanged
+# Skip the compressed variant unless it saves at least this fraction (PNG/JPEG barely shrink)
+MIN_COMPRESSION_SAVING = 0.1
+
+_COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml", "application/xml")
+
+
+class Asset:
+    __slots__ = ("body", "media_type", "digest", "variants", "etags")
+
+    def __init__(self, body: bytes, media_type: str):
+        self.body = body
+        self.media_type = media_type
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+        self.variants = {}  # content-encoding -> bytes
+        if media_type.startswith(_COMPRESSIBLE):
+            self._add_variant("gzip", gzip.compress(body, compresslevel=9, mtime=0))
+            if brotli is not None:
+                self._add_variant("br", brotli.compress(body, quality=11))
+        self.etags = {self.etag(None)} | {self.etag(encoding) for encoding in self.variants}
+
+    def _add_variant(self, encoding: str, data: bytes):
+        if len(data) <= len(self.body) * (1 - MIN_COMPRESSION_SAVING):
+            self.variants[encoding] = data
+
+    def etag(self, encoding: str = None) -> str:
+        return f'"{self.digest}-{encoding}"' if encoding else f'"{self.digest}"'
+
+    def pick(self, accept_encoding: str) -> tuple:
+        """(content-encoding or None, body) for the client's Accept-Encoding; brotli over gzip over identity."""
+        accepted = {
+            token.split(";")[0].strip().lower()
+            for token in (accept_encoding or "").split(",")
+            if not token.replace(" ", "").endswith(";q=0")
+        }
+        for encoding in ("br", "gzip"):
+            if encoding in accepted and encoding in self.variants:
+                return encoding, self.variants[encoding]
+        return None, self.body
+
+    def matches(self, if_none_match: str) -> bool:
+        if not if_none_match:
+            return False
+        tokens = {token.strip().removeprefix("W/") for token in if_none_match.split(",")}
+        return "*" in tokens or not tokens.isdisjoint(self.etags)
+
+
+def _media_type(path: str) -> str:
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if media_type.startswith("text/") or media_type in ("application/javascript", "application/json"):
+        media_type += "; charset=utf-8"
+    return media_type
+
+
+class StaticSite:
+    """The index page plus the static files, loaded once; `reload()` picks up a new frontend build."""
+
+    def __init__(self, directory: str = FRONTEND_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self.index = None
+        self.files = {}  # plain name -> Asset
+        self.fingerprinted = {}  # hashed name -> Asset
+        self.stats = {"served": 0, "not_modified": 0, "bytes_sent": 0}
+        self.reload()
+
+    @staticmethod
+    def fingerprint(name: str, asset: Asset) -> str:
+        stem, ext = os.path.splitext(name)
+        return f"{stem}.{asset.digest[:10]}{ext}"
+
+    def reload(self):
+        static_dir = os.path.join(self.directory, "static")
+        files, fingerprinted = {}, {}
+        for root, _, names in os.walk(static_dir):
+            for filename in names:
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, static_dir).replace(os.sep, "/")
+                with open(path, "rb") as f:
+                    asset = Asset(f.read(), _media_type(path))
+                files[name] = asset
+                fingerprinted[self.fingerprint(name, asset)] = asset
+
+        with open(os.path.join(self.directory, "index.html"), "r", encoding="utf-8") as f:
+            html = f.read()
+        # Longest names first so "a.png" can't clobber part of "ba.png"
+        for name in sorted(files, key=len, reverse=True):
+            html = html.replace(f"/static/{name}", f"/static/{self.fingerprint(name, files[name])}")
+        index = Asset(html.encode("utf-8"), "text/html; charset=utf-8")
+
+        with self._lock:
+            self.files, self.fingerprinted, self.index = files, fingerprinted, index
+        logger.info(f"Loaded frontend: index.html + {len(files)} static files "
+                    f"(gzip variants: {sum('gzip' in a.variants for a in [index, *files.values()])}, "
+                    f"brotli {'on' if brotli else 'off'})")
+
+    def lookup(self, name: str) -> tuple:
+        """(asset, cache-control) for a /static path, or (None, None)."""
+        asset = self.fingerprinted.get(name)
+        if asset is not None:
+            return asset, IMMUTABLE_CACHE_CONTROL
+        asset = self.files.get(name)
+        if asset is not None:
+            return asset, f"public, max-age={STATIC_MAX_AGE}"
+        return None, None
+
+    def respond(self, request: Request, asset: Asset, cache_control: str) -> Response:
+        """200 with the best encoding, or 304 when the client already has this version."""
+        encoding, body = asset.pick(request.headers.get("accept-encoding"))
+        headers = {"ETag": asset.etag(encoding), "Cache-Control": cache_control}
+        if asset.variants:
+            headers["Vary"] = "Accept-Encoding"
+        if asset.matches(request.headers.get("if-none-match")):
+            self.stats["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        self.stats["served"] += 1
+        self.stats["bytes_sent"] += len(body)
+        if request.method == "HEAD":
+            headers["Content-Length"] = str(len(body))
+            return Response(status_code=200, headers=headers, media_type=asset.media_type)
+        return Response(content=body, headers=headers, media_type=asset.media_type)
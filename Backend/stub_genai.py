@@ -0,0 +1,193 @@
+"""
+Offline stand-in for google.genai.Client, used when LLM_STUB=1 and by local tests.
+It implements the subset of the SDK the agent uses and never touches the network.
+"""
+import asyncio
+import datetime
+import itertools
+import time
+from google.genai import types
+
+
+def estimate_tokens(text: str) -> int:
+    # Rough English-text ratio; good enough for comparing prompt sizes offline
+    return max(1, len(text or "") // 4)
+
+
+def _contents_text(contents) -> str:
+    if isinstance(contents, str):
+        return contents
+    chunks = []
+    for content in contents or []:
+        for part in content.parts or []:
+            if part.text:
+                chunks.append(part.text)
+            elif part.function_call:
+                chunks.append(f"{part.function_call.name}{part.function_call.args}")
+            elif part.function_response:
+                chunks.append(str(part.function_response.response))
+    return "\n".join(chunks)
+
+
+def _instruction_text(instruction) -> str:
+    if instruction is None:
+        return ""
+    if isinstance(instruction, str):
+        return instruction
+    return _contents_text([instruction])
+
+
+def default_responder(contents, config) -> str:
+    if isinstance(contents, str):
+        return f"Stub reply to: {contents[-200:]}"
+    last = contents[-1] if contents else None
+    text = _contents_text([last]) if last else ""
+    return f"Stub reply to: {text[-200:]}"
+
+
+class _StubCaches:
+    def __init__(self, owner):
+        self._owner = owner
+        self._entries = {}  # name -> (CachedContent, token_count, create config)
+        self._ids = itertools.count(1)
+
+    def _expiry(self, ttl: str) -> datetime.datetime:
+        seconds = float((ttl or "3600s").rstrip("s"))
+        return datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=seconds)
+
+    def create(self, *, model: str, config: types.CreateCachedContentConfig):
+        tokens = estimate_tokens(_instruction_text(config.system_instruction))
+        if tokens < self._owner.min_cache_tokens:
+            raise ValueError(f"Cached content is too small: {tokens} < {self._owner.min_cache_tokens} tokens")
+        name = f"cachedContents/stub-{next(self._ids)}"
+        cached = types.CachedContent(
+            name=name, model=model, expire_time=self._expiry(config.ttl),
+            usage_metadata=types.CachedContentUsageMetadata(total_token_count=tokens),
+        )
+        self._entries[name] = (cached, tokens, config)
+        return cached
+
+    def update(self, *, name: str, config: types.UpdateCachedContentConfig):
+        cached, tokens, create_config = self.lookup(name)
+        cached = cached.model_copy(update={"expire_time": self._expiry(config.ttl)})
+        self._entries[name] = (cached, tokens, create_config)
+        return cached
+
+    def delete(self, *, name: str):
+        self._entries.pop(name, None)
+
+    def lookup(self, name: str):
+        entry = self._entries.get(name)
+        if entry is None or entry[0].expire_time < datetime.datetime.now(datetime.timezone.utc):
+            self._entries.pop(name, None)
+            raise ValueError(f"CachedContent not found (or expired): {name}")
+        return entry
+
+
+class _StubModels:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def generate_content(self, *, model: str, contents, config: types.GenerateContentConfig = None):
+        owner = self._owner
+        owner.calls += 1
+        if owner.latency:
+            time.sleep(owner.latency)
+        return owner.build_response(contents, config)
+
+
+class _AsyncStubModels:
+    def __init__(self, owner):
+        self._owner = owner
+
+    async def generate_content(self, *, model: str, contents, config: types.GenerateContentConfig = None):
+        owner = self._owner
+        owner.calls += 1
+        if owner.latency:
+            await asyncio.sleep(owner.latency)
+        return owner.build_response(contents, config)
+
+    async def generate_content_stream(self, *, model: str, contents, config: types.GenerateContentConfig = None):
+        owner = self._owner
+        owner.calls += 1
+        if owner.latency:
+            await asyncio.sleep(owner.latency)
+        response = owner.build_response(contents, config)
+
+        async def chunks():
+            for chunk in owner.split_response(response):
+                yield chunk
+                await asyncio.sleep(0)
+        return chunks()
+
+
+class _AsyncStubCaches:
+    def __init__(self, caches: _StubCaches):
+        self._caches = caches
+
+    async def create(self, **kwargs):
+        return self._caches.create(**kwargs)
+
+    async def update(self, **kwargs):
+        return self._caches.update(**kwargs)
+
+    async def delete(self, **kwargs):
+        return self._caches.delete(**kwargs)
+
+
+class _AsyncNamespace:
+    def __init__(self, owner):
+        self.models = _AsyncStubModels(owner)
+        self.caches = _AsyncStubCaches(owner.caches)
+
+
+class StubClient:
+    """
+    Mimics genai.Client: `responder(contents, config)` returns either reply text or a list of
+    types.Part (e.g. function calls). `latency` adds a fixed delay per generate call.
+    """
+
+    def __init__(self, responder=None, latency: float = 0.0, min_cache_tokens: int = 0):
+        self.responder = responder or default_responder
+        self.latency = latency
+        self.min_cache_tokens = min_cache_tokens
+        self.calls = 0
+        self.caches = _StubCaches(self)
+        self.models = _StubModels(self)
+        self.aio = _AsyncNamespace(self)
+
+    def split_response(self, response: types.GenerateContentResponse) -> list:
+        """Breaks a response into word-sized text chunks like a streamed reply; usage rides on the last one."""
+        chunks = []
+        for part in response.candidates[0].content.parts:
+            pieces = part.text.split(" ") if part.text else [None]
+            for i, piece in enumerate(pieces):
+                chunk_part = part if piece is None else types.Part(text=piece if i == 0 else " " + piece)
+                chunks.append(types.GenerateContentResponse(
+                    candidates=[types.Candidate(content=types.Content(role="model", parts=[chunk_part]))]
+                ))
+        chunks[-1].usage_metadata = response.usage_metadata
+        return chunks
+
+    def build_response(self, contents, config) -> types.GenerateContentResponse:
+        cached_tokens = 0
+        system_text = ""
+        if config is not None and config.cached_content:
+            _, cached_tokens, _ = self.caches.lookup(config.cached_content)
+        elif config is not None:
+            system_text = _instruction_text(config.system_instruction)
+
+        reply = self.responder(contents, config)
+        parts = [types.Part(text=reply)] if isinstance(reply, str) else list(reply)
+        reply_text = _contents_text([types.Content(role="model", parts=parts)])
+
+        prompt_tokens = estimate_tokens(_contents_text(contents)) + estimate_tokens(system_text) + cached_tokens
+        return types.GenerateContentResponse(
+            candidates=[types.Candidate(content=types.Content(role="model", parts=parts))],
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_tokens,
+                cached_content_token_count=cached_tokens or None,
+                candidates_token_count=estimate_tokens(reply_text),
+                total_token_count=prompt_tokens + estimate_tokens(reply_text),
+            ),
+        )
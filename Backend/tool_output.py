@@ -0,0 +1,144 @@
+"""
+Compact encoding of the card datasets returned to Gemini. Cards go out as one CSV table with a header
+row instead of a JSON object per card repeating every key, a page at a time, and each tool result is
+trimmed to a token budget. Each result is measured against the unpaginated JSON dump the tools used to
+send and the saving is logged, added to the turn's trace and exported on /metrics.
+"""
+import csv
+import io
+import json
+import os
+import threading
+from tracing import current_trace
+import logging
+logger = logging.getLogger("Tool-Output")
+
+TOOL_TOKEN_BUDGET = int(os.getenv("TOOL_TOKEN_BUDGET", "600"))  # per tool result
+TOOL_PAGE_SIZE = int(os.getenv("TOOL_PAGE_SIZE", "5"))
+TOOL_MAX_PAGE_SIZE = int(os.getenv("TOOL_MAX_PAGE_SIZE", "10"))
+TOOL_FIELD_MAX_CHARS = int(os.getenv("TOOL_FIELD_MAX_CHARS", "160"))
+PREAMBLE_TOKENS = 90  # room kept for the heading and "show more" hint around the table
+TABLE_HEADING = "Credit Card Dataset (CSV):"  # precedes the table in every card result
+
+# (column, card key); same fields, in the same order, as the JSON the tools used to send
+CARD_COLUMNS = (
+    ("rank", None),
+    ("card_name", "card_name"),
+    ("network", "payment_network"),
+    ("joining_fee", "joining_fee"),
+    ("annual_fee", "annual_fee"),
+    ("reward_type", "reward_method"),
+    ("fee_waiver", "fee_waiver"),
+    ("other_benefits", "other_benefits"),
+    ("preferred_bank", "PreferredBank"),
+    ("min_cibil", "MinCIBIL"),
+    ("min_annual_income", "MinAnnualIncome"),
+)
+
+_stats_lock = threading.Lock()
+stats = {"pages": 0, "tokens": 0, "json_tokens": 0, "trimmed_rows": 0}
+
+
+def estimate_tokens(text: str) -> int:
+    """Same ~4 characters per token estimate the conversation trimming uses."""
+    return (len(text) + 3) // 4
+
+
+def page_bounds(page: int = 1, page_size: int = TOOL_PAGE_SIZE, cursor: int = 0) -> tuple:
+    """(offset, size) into the ranked list; a positive cursor (cards already shown) wins over page."""
+    try:
+        size = max(1, min(int(page_size or TOOL_PAGE_SIZE), TOOL_MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        size = TOOL_PAGE_SIZE
+    try:
+        cursor = int(cursor or 0)
+        page = int(page or 1)
+    except (TypeError, ValueError):
+        cursor, page = 0, 1
+    offset = cursor if cursor > 0 else (max(page, 1) - 1) * size
+    return offset, size
+
+
+def _cell(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    text = " ".join(str(value).split())
+    if len(text) > TOOL_FIELD_MAX_CHARS:
+        text = text[:TOOL_FIELD_MAX_CHARS - 3].rstrip() + "..."
+    return text
+
+
+def _csv_line(values) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerow(values)
+    return buffer.getvalue()
+
+
+def _legacy_json(cards: list[dict]) -> str:
+    """The per-card JSON the tools sent before, kept only to measure the saving."""
+    return json.dumps([
+        {
+            "Card Name": card.get("card_name", "N/A"),
+            "Network": card.get("payment_network", "N/A"),
+            "Joining Fee": card.get("joining_fee", "N/A"),
+            "Annual Fee": card.get("annual_fee", "N/A"),
+            "Reward Type": card.get("reward_method", "N/A"),
+            "Fee Waiver": card.get("fee_waiver", "N/A"),
+            "Other Benefits": card.get("other_benefits", "N/A"),
+            "Preferred Bank": card.get("PreferredBank", "No"),
+            "Min CIBIL": card.get("MinCIBIL", "N/A"),
+            "Min Annual Income": card.get("MinAnnualIncome", "N/A"),
+        }
+        for card in cards
+    ], ensure_ascii=False, separators=(",", ":"))
+
+
+def encode_cards(cards: list[dict], first_rank: int, preamble_tokens: int = PREAMBLE_TOKENS,
+                 budget: int = TOOL_TOKEN_BUDGET) -> tuple:
+    """
+    (csv table, rows kept) for `cards`, numbered from `first_rank`. Rows are dropped from the end until
+    the table plus `preamble_tokens` fits the budget; the first row is always kept.
+    """
+    lines = [_csv_line(column for column, _ in CARD_COLUMNS)]
+    used = preamble_tokens + estimate_tokens(lines[0])
+    for i, card in enumerate(cards):
+        line = _csv_line([first_rank + i] + [_cell(card.get(key)) for _, key in CARD_COLUMNS[1:]])
+        cost = estimate_tokens(line)
+        if i > 0 and used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+    return "".join(lines), len(lines) - 1
+
+
+def decode_cards(result: str) -> list[dict]:
+    """Rows of the table in a card tool result, keyed by CARD_COLUMNS names; [] when it carries no table."""
+    _, found, table = result.partition(TABLE_HEADING + "\n")
+    return list(csv.DictReader(io.StringIO(table))) if found else []
+
+
+def legacy_tokens(cards: list[dict]) -> int:
+    """Tokens the same cards took as the old JSON dump."""
+    return estimate_tokens(_legacy_json(cards))
+
+
+def record(tool: str, tokens: int, json_tokens: int, trimmed_rows: int = 0):
+    """Logs and counts one card result; the saving is also added to the current turn's trace."""
+    with _stats_lock:
+        stats["pages"] += 1
+        stats["tokens"] += tokens
+        stats["json_tokens"] += json_tokens
+        stats["trimmed_rows"] += trimmed_rows
+    trace_ = current_trace.get()
+    if trace_ is not None:
+        trace_.attrs["tool_tokens"] = trace_.attrs.get("tool_tokens", 0) + tokens
+        trace_.attrs["tool_tokens_saved"] = trace_.attrs.get("tool_tokens_saved", 0) + json_tokens - tokens
+    saved = 100.0 * (1 - tokens / json_tokens) if json_tokens else 0.0
+    logger.info(f"{tool} result: ~{tokens} tokens vs ~{json_tokens} as JSON ({saved:.0f}% fewer)")
+
+
+def metrics() -> dict:
+    with _stats_lock:
+        return dict(stats)
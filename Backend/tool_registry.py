@@ -0,0 +1,87 @@
+import inspect
+import re
+import logging
+from lazy_imports import lazy_module
+types = lazy_module("google.genai.types")
+logger = logging.getLogger("Tool-Registry")
+
+TOOL_NAME_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_\.\-:]{0,63}$')
+
+_JSON_TYPES = {
+    str: "string",
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+}
+
+
+def _parameters_schema(fn) -> dict:
+    """JSON schema for fn's parameters, typed from its annotations (unannotated -> string)."""
+    params = {
+        "type": "object",
+        "properties": {},
+        "required": []
+    }
+    for param_name, param in inspect.signature(fn).parameters.items():
+        params["properties"][param_name] = {"type": _JSON_TYPES.get(param.annotation, "string")}
+        if param.default is inspect.Parameter.empty:
+            params["required"].append(param_name)
+    return params
+
+
+class ToolRegistry:
+    """
+    Name -> tool function mapping that also owns the Gemini function declarations.
+    Schemas are compiled when a tool is registered; the declaration set is built once
+    and only rebuilt after the registry changes.
+    """
+
+    def __init__(self):
+        self._tools = {}
+        self._declarations = None
+
+    def register(self, name: str, fn, description: str = None):
+        if not name or not TOOL_NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid function name: {name}")
+        self._tools[name] = {
+            "fn": fn,
+            "description": description or fn.__doc__ or f"Function {name} for Gemini tool calling.",
+            "parameters": _parameters_schema(fn),
+        }
+        self._declarations = None
+        return fn
+
+    def unregister(self, name: str):
+        if self._tools.pop(name, None) is not None:
+            self._declarations = None
+
+    @property
+    def declarations(self) -> tuple:
+        if self._declarations is None:
+            self._declarations = (
+                types.Tool(function_declarations=[
+                    types.FunctionDeclaration(name=name, description=tool["description"], parameters=tool["parameters"])
+                    for name, tool in self._tools.items()
+                ]),
+            )
+            logger.info(f"Compiled {len(self._tools)} tool declarations")
+        return self._declarations
+
+    def __getitem__(self, name: str):
+        return self._tools[name]["fn"]
+
+    def get(self, name: str, default=None):
+        tool = self._tools.get(name)
+        return tool["fn"] if tool else default
+
+    def __contains__(self, name):
+        return name in self._tools
+
+    def __iter__(self):
+        return iter(self._tools)
+
+    def __len__(self):
+        return len(self._tools)
+
+    def items(self):
+        return ((name, tool["fn"]) for name, tool in self._tools.items())
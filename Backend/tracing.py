@@ -0,0 +1,213 @@
+"""
+Lightweight per-turn tracing. `span(name)` times one phase of a turn (prompt build, Gemini call, tool,
+DB query, SMTP send); every span feeds the Prometheus-style metrics served at /metrics, and spans that
+run inside a `trace()` are also collected and optionally appended to a JSON-lines file (TRACE_FILE).
+Span attributes carry sizes, counts and token numbers only, never message text or tool arguments.
+"""
+import contextlib
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+import logging
+logger = logging.getLogger("Tracing")
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1") == "1"
+TRACE_FILE = os.getenv("TRACE_FILE", "")  # JSON-lines trace per turn; empty disables
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Trace of the turn being handled; tool threads inherit it through the copied context
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class Span:
+    __slots__ = ("name", "labels", "attrs", "start", "duration", "status")
+
+    def __init__(self, name: str, labels: dict):
+        self.name = name
+        self.labels = labels
+        self.attrs = {}
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.status = "ok"
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self, origin: float) -> dict:
+        return {
+            "name": self.name,
+            **self.labels,
+            "offset_ms": round(1000 * (self.start - origin), 3),
+            "duration_ms": round(1000 * self.duration, 3),
+            "status": self.status,
+            **self.attrs,
+        }
+
+
+class Metrics:
+    """Counters and latency histograms per (span, labels), rendered in the Prometheus text format."""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms = {}  # (span, labels) -> [bucket counts..., count, sum]
+        self._errors = {}  # (span, labels) -> count
+        self._totals = {}  # (metric, span, labels) -> summed span attribute
+        self._collectors = []  # (prefix, fn returning {name: number}, names that are counters)
+
+    def observe(self, span: Span):
+        key = (span.name, tuple(sorted(span.labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if span.duration <= bound:
+                    hist[i] += 1
+            hist[-2] += 1
+            hist[-1] += span.duration
+            if span.status != "ok":
+                self._errors[key] = self._errors.get(key, 0) + 1
+            for attr, value in span.attrs.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    total_key = (attr,) + key
+                    self._totals[total_key] = self._totals.get(total_key, 0) + value
+
+    def add_collector(self, prefix: str, collect, counters=()):
+        """
+        `collect()` returns a flat dict of numbers exported as `<prefix>_<name>` gauges on every scrape. Names
+        listed in `counters` only ever grow (hits, sends, checkouts) and are exported as `<prefix>_<name>_total`
+        counters instead, so rate() handles a process restart.
+        """
+        self._collectors.append((prefix, collect, frozenset(counters)))
+
+    @staticmethod
+    def _labels(pairs) -> str:
+        return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+    def render(self) -> str:
+        lines = [
+            "# HELP span_duration_seconds Duration of each traced phase of a chat turn",
+            "# TYPE span_duration_seconds histogram",
+        ]
+        with self._lock:
+            histograms = {key: list(hist) for key, hist in self._histograms.items()}
+            errors = dict(self._errors)
+            totals = dict(self._totals)
+        for (name, labels), hist in sorted(histograms.items()):
+            base = (("span", name),) + labels
+            for bound, count in zip(self.buckets, hist):
+                lines.append(f"span_duration_seconds_bucket{self._labels(base + (('le', bound),))} {count}")
+            lines.append(f"span_duration_seconds_bucket{self._labels(base + (('le', '+Inf'),))} {hist[-2]}")
+            lines.append(f"span_duration_seconds_count{self._labels(base)} {hist[-2]}")
+            lines.append(f"span_duration_seconds_sum{self._labels(base)} {hist[-1]:.6f}")
+
+        lines += ["# HELP span_errors_total Traced phases that raised", "# TYPE span_errors_total counter"]
+        for (name, labels), count in sorted(errors.items()):
+            lines.append(f"span_errors_total{self._labels((('span', name),) + labels)} {count}")
+
+        lines += ["# HELP span_attribute_total Summed numeric span attributes (tokens, bytes, rows)",
+                  "# TYPE span_attribute_total counter"]
+        for (attr, name, labels), value in sorted(totals.items()):
+            lines.append(f"span_attribute_total{self._labels((('span', name), ('attr', attr)) + labels)} {value}")
+
+        for prefix, collect, counters in self._collectors:
+            try:
+                values = collect()
+            except Exception as e:
+                logger.warning(f"Metrics collector {prefix} failed: {e}")
+                continue
+            for key, value in values.items():
+                if not isinstance(value, (int, float)) or isinstance(value, bool):
+                    continue
+                name = f"{prefix}_{key}"
+                if key in counters:
+                    name = name if name.endswith("_total") else name + "_total"
+                    lines.append(f"# TYPE {name} counter")
+                else:
+                    lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class Trace:
+    def __init__(self, kind: str):
+        self.trace_id = secrets.token_hex(8)
+        self.kind = kind
+        self.start = time.perf_counter()
+        self.started_at = time.time()
+        self.spans = []
+        self.attrs = {}
+
+
+metrics = Metrics()
+_trace_file_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def span(name: str, **labels):
+    """Times the enclosed block. Keep `labels` low-cardinality (tool or table names); use span.set() for the rest."""
+    if not TRACING_ENABLED:
+        yield Span(name, labels)
+        return
+    current = Span(name, labels)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = type(e).__name__
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.start
+        metrics.observe(current)
+        trace_ = current_trace.get()
+        if trace_ is not None:
+            trace_.spans.append(current)
+
+
+@contextlib.contextmanager
+def trace(kind: str, **attrs):
+    """Collects the spans of one turn; the whole turn is itself recorded as a span named `kind`."""
+    if not TRACING_ENABLED:
+        yield None
+        return
+    current = Trace(kind)
+    current.attrs.update(attrs)
+    token = current_trace.set(current)
+    try:
+        with span(kind) as root:
+            yield current
+            root.set(**current.attrs)
+    finally:
+        try:
+            current_trace.reset(token)
+        except ValueError:  # generator finished in another context (e.g. a closed stream)
+            current_trace.set(None)
+        if TRACE_FILE:
+            _write(current, root)
+
+
+def annotate(**attrs):
+    """Adds attributes to the current turn's trace (e.g. which route answered it)."""
+    trace_ = current_trace.get()
+    if trace_ is not None:
+        trace_.attrs.update(attrs)
+
+
+def _write(trace_: Trace, root: Span):
+    record = {
+        "trace_id": trace_.trace_id,
+        "kind": trace_.kind,
+        "ts": round(trace_.started_at, 3),
+        "duration_ms": round(1000 * root.duration, 3),
+        **trace_.attrs,
+        "spans": [s.to_dict(trace_.start) for s in trace_.spans if s is not root],
+    }
+    line = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+    try:
+        with _trace_file_lock, open(TRACE_FILE, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except OSError as e:
+        logger.warning(f"Could not write trace to {TRACE_FILE}: {e}")